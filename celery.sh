@@ -1,4 +1,4 @@
 #!/bin/bash
 
 echo "Starting Celery worker..."
-pipenv run celery -A document_archive worker
\ No newline at end of file
+pipenv run celery -A document_archive worker -Q "${CELERY_QUEUES:-interactive,bulk}" ${CELERY_CONCURRENCY:+--concurrency "$CELERY_CONCURRENCY"}
\ No newline at end of file
@@ -1,45 +1,52 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import argparse
+import hashlib
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 
 class DocumentApiClient:
     """Client for testing the Document Upload API endpoint."""
-    
-    def __init__(self, base_url):
+
+    def __init__(self, base_url, pool_size=10, retries=5):
         self.base_url = base_url.rstrip('/')
-        self.upload_endpoint = f"{self.base_url}/api/document/"  # Adjust the path as needed
-    
-    def upload_document(self, file_path, title=None, correspondent_id=None, 
-                       document_type_id=None, tag_ids=None, created=None):
+        self.upload_endpoint = f"{self.base_url}/api/documents/"
+
+        # One keep-alive session shared by every upload. Retries cover
+        # connection errors and 5xx responses, including on POST, with
+        # exponential backoff (1s, 2s, 4s, ...).
+        retry = Retry(
+            total=retries,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post_document(self, file_path, title=None, correspondent_id=None,
+                      document_type_id=None, tag_ids=None, created=None):
         """
-        Upload a document to the API endpoint.
-        
-        Args:
-            file_path (str): Path to the file to upload
-            title (str, optional): Title for the document
-            correspondent_id (int, optional): ID of correspondent
-            document_type_id (int, optional): ID of document type
-            tag_ids (list, optional): List of tag IDs
-            created (str, optional): Created date in YYYY-MM-DD format
-            
-        Returns:
-            dict: API response data
+        POST a document to the API and return the response.
+
+        Raises:
+            requests.exceptions.RequestException: if the request fails after retries
         """
-        # Validate file exists
-        if not os.path.isfile(file_path):
-            print(f"Error: File {file_path} not found")
-            return None
-            
-        # Prepare file for upload
         filename = os.path.basename(file_path)
-        
+
         # Prepare form data
         data = {}
-        files = {'document': (filename, open(file_path, 'rb'))}
-        
+
         # Add optional parameters if provided
         if title:
             data['title'] = title
@@ -56,54 +63,233 @@ class DocumentApiClient:
         else:
             # Use current date as default
             data['created'] = datetime.now().strftime('%Y-%m-%d')
-            
-        try:
-            # Make the POST request
-            response = requests.post(
+
+        with open(file_path, 'rb') as f:
+            return self.session.post(
                 self.upload_endpoint,
                 data=data,
-                files=files
+                files={'document': (filename, f)},
+            )
+
+    def upload_document(self, file_path, title=None, correspondent_id=None,
+                       document_type_id=None, tag_ids=None, created=None):
+        """
+        Upload a document to the API endpoint.
+
+        Args:
+            file_path (str): Path to the file to upload
+            title (str, optional): Title for the document
+            correspondent_id (int, optional): ID of correspondent
+            document_type_id (int, optional): ID of document type
+            tag_ids (list, optional): List of tag IDs
+            created (str, optional): Created date in YYYY-MM-DD format
+
+        Returns:
+            dict: API response data
+        """
+        # Validate file exists
+        if not os.path.isfile(file_path):
+            print(f"Error: File {file_path} not found")
+            return None
+
+        try:
+            response = self.post_document(
+                file_path,
+                title=title,
+                correspondent_id=correspondent_id,
+                document_type_id=document_type_id,
+                tag_ids=tag_ids,
+                created=created,
             )
-            
-            # Close the file
-            files['document'][1].close()
-            
+
             # Process response
             if response.status_code == 201:
                 print(f"Document uploaded successfully! Document ID: {response.json()['id']}")
                 return response.json()
+            elif response.status_code == 200 and response.json().get('status') == 'duplicate':
+                print(f"Document already exists. Document ID: {response.json()['id']}")
+                return response.json()
             else:
                 print(f"Error uploading document. Status code: {response.status_code}")
                 print(f"Response: {response.text}")
                 return None
-                
+
         except requests.exceptions.RequestException as e:
             print(f"Request failed: {e}")
             return None
 
+    def upload_directory(self, directory, manifest_path, workers=4, **fields):
+        """
+        Upload every new or changed file below a directory in parallel.
+
+        Files are skipped when the manifest already records them with the
+        same size and modification time, or when a file with the same
+        checksum was already uploaded. Files are hashed by the upload
+        workers, and recorded in the manifest only once the server accepted
+        them; the manifest is rewritten as uploads complete, so an
+        interrupted run picks up where it stopped.
+
+        Args:
+            directory (str): Directory to upload
+            manifest_path (str): JSON file recording uploaded files
+            workers (int): Number of concurrent uploads
+            **fields: Metadata passed to every upload (title, tag_ids, ...)
+
+        Returns:
+            dict: Counts of uploaded, skipped and failed files
+        """
+        manifest = load_manifest(manifest_path)
+        # Only checksums of successful uploads; written by the main thread,
+        # read by the workers
+        uploaded_checksums = {entry['md5'] for entry in manifest.values()}
+        own_files = {os.path.abspath(manifest_path), os.path.abspath(f"{manifest_path}.tmp")}
+
+        pending = []
+        skipped = 0
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if os.path.abspath(path) in own_files:
+                    continue
+                key = os.path.relpath(path, directory)
+                stat = os.stat(path)
+                entry = manifest.get(key)
+                if entry and (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                    skipped += 1
+                    continue
+                pending.append((key, path, stat))
+
+        def upload(path):
+            # Hashing happens in the workers, so uploads start right away
+            checksum = file_md5(path)
+            if checksum in uploaded_checksums:
+                return checksum, None
+            return checksum, self.post_document(path, **fields)
+
+        progress = UploadProgress(len(pending), sum(stat.st_size for _, _, stat in pending))
+        uploaded = 0
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(upload, path): (key, path, stat) for key, path, stat in pending}
+            for future in as_completed(futures):
+                key, path, stat = futures[future]
+                try:
+                    checksum, response = future.result()
+                    ok = response is None or 200 <= response.status_code < 300
+                    error = None if ok else f"status {response.status_code}: {response.text[:200]}"
+                except (OSError, requests.exceptions.RequestException) as e:
+                    ok, error = False, str(e)
+
+                # Only recorded once the server has the file
+                if ok:
+                    if response is None:
+                        skipped += 1
+                    else:
+                        uploaded += 1
+                    manifest[key] = {
+                        'size': stat.st_size,
+                        'mtime_ns': stat.st_mtime_ns,
+                        'md5': checksum,
+                        'id': response.json().get('id') if response is not None else None,
+                    }
+                    uploaded_checksums.add(checksum)
+                    if progress.done % 50 == 0:
+                        save_manifest(manifest_path, manifest)
+                else:
+                    failed += 1
+                    print(f"Failed to upload {path}: {error}")
+                progress.update(stat.st_size)
+
+        save_manifest(manifest_path, manifest)
+        progress.finish()
+        return {'uploaded': uploaded, 'skipped': skipped, 'failed': failed}
+
+
+class UploadProgress:
+    """Prints upload progress and throughput."""
+
+    def __init__(self, total_files, total_bytes):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.done_bytes = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, size):
+        with self.lock:
+            self.done += 1
+            self.done_bytes += size
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            print(
+                f"[{self.done}/{self.total_files}] "
+                f"{self.done_bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB, "
+                f"{self.done / elapsed:.1f} files/s, {self.done_bytes / 1e6 / elapsed:.1f} MB/s"
+            )
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        print(f"Uploaded {self.done} files ({self.done_bytes / 1e6:.1f} MB) in {elapsed:.1f}s")
+
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    # Write to a temporary file first so an interrupted run never leaves a
+    # truncated manifest behind.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
 
 def main():
     parser = argparse.ArgumentParser(description='Upload a document to the API')
     parser.add_argument('--url', required=True, help='Base URL of the API')
-    parser.add_argument('--file', required=True, help='Path to the file to upload')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help='Path to the file to upload')
+    source.add_argument('--dir', help='Upload every new or changed file below this directory')
     parser.add_argument('--title', help='Title for the document')
     parser.add_argument('--correspondent', type=int, help='Correspondent ID')
     parser.add_argument('--document-type', type=int, help='Document Type ID')
     parser.add_argument('--tags', type=int, nargs='+', help='Tag IDs')
     parser.add_argument('--created', help='Created date (YYYY-MM-DD)')
-    
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent uploads with --dir')
+    parser.add_argument('--manifest', help='Manifest file with --dir (default: <dir>/.upload-manifest.json)')
+
     args = parser.parse_args()
-    
-    client = DocumentApiClient(args.url)
-    result = client.upload_document(
-        args.file,
+
+    client = DocumentApiClient(args.url, pool_size=args.workers)
+    fields = dict(
         title=args.title,
         correspondent_id=args.correspondent,
         document_type_id=args.document_type,
         tag_ids=args.tags,
         created=args.created
     )
-    
+
+    if args.dir:
+        manifest = args.manifest or os.path.join(args.dir, '.upload-manifest.json')
+        result = client.upload_directory(args.dir, manifest, workers=args.workers, **fields)
+        print(f"{result['uploaded']} uploaded, {result['skipped']} skipped, {result['failed']} failed")
+        sys.exit(1 if result['failed'] else 0)
+
+    result = client.upload_document(args.file, **fields)
+
     if result:
         sys.exit(0)
     else:
@@ -111,4 +297,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
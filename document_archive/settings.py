@@ -44,6 +44,15 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'document_archive.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'document_archive.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 INSTALLED_APPS = [
@@ -212,7 +221,102 @@ AUDIT_LOG_ENABLED=False
 ORIGINAL_DIR=os.getenv("ORIGINAL_DIR")
 ARCHIVE_DIR=os.getenv("ARCHIVE_DIR")
 
+# Days soft-deleted documents and notes stay in the trash before
+# `manage.py purge_trash` removes them for good.
+TRASH_RETENTION_DAYS = int(os.getenv("TRASH_RETENTION_DAYS", 30))
+
+# "local" keeps files under the directories above; "s3" stores them in an
+# S3-compatible bucket (AWS S3, MinIO) so API and workers need no shared disk.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_REGION = os.getenv("S3_REGION")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+S3_PRESIGNED_URL_EXPIRY = int(os.getenv("S3_PRESIGNED_URL_EXPIRY", 3600))
+
+# Store originals zstd-compressed after processing (needs the zstandard
+# package). ZSTD_DICTIONARY_ID selects a dictionary trained with
+# `manage.py train_zstd_dictionary` for small files.
+COMPRESS_ORIGINALS = os.getenv("COMPRESS_ORIGINALS") == "1"
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 10))
+ZSTD_DICTIONARY_ID = int(os.getenv("ZSTD_DICTIONARY_ID", 0))
+
+# Store new documents encrypted with a key derived from ENCRYPTION_KEY.
+# Existing documents are encrypted with `manage.py encrypt_documents`.
+ENCRYPT_DOCUMENTS = os.getenv("ENCRYPT_DOCUMENTS") == "1"
+
+# Keep thumbnails in packed segment files under THUMBNAIL_DIR/packs rather
+# than one file each. The pack is read through mmap, so it needs a local
+# THUMBNAIL_DIR shared by the API and the workers. Existing thumbnail files
+# are packed with `manage.py pack_thumbnails`.
+PACK_THUMBNAILS = os.getenv("PACK_THUMBNAILS", "1" if STORAGE_BACKEND == "local" else "0") == "1"
+
+# GhostScript optimization applied when generating archives: "lossless"
+# never re-encodes images, "balanced" downsamples scans to 200 dpi and
+# "compact" to 150 dpi with stronger JPEG compression. Existing archives
+# are regenerated with `manage.py optimize_archives`.
+ARCHIVE_PROFILE = os.getenv("ARCHIVE_PROFILE", "balanced")
+
+# Profile for archives of JPEG, PNG, TIFF, GIF and WebP uploads, which are
+# wrapped into a PDF without LibreOffice. "lossless" keeps JPEGs as they
+# were uploaded.
+IMAGE_ARCHIVE_PROFILE = os.getenv("IMAGE_ARCHIVE_PROFILE", "lossless")
+
+# GhostScript and LibreOffice runs are killed together with their process
+# group after their timeout in seconds, which also caps their CPU time.
+# Their memory is capped at SUBPROCESS_MEMORY_LIMIT bytes.
+GHOSTSCRIPT_TIMEOUT = int(os.getenv("GHOSTSCRIPT_TIMEOUT", "300"))
+LIBREOFFICE_TIMEOUT = int(os.getenv("LIBREOFFICE_TIMEOUT", "300"))
+SUBPROCESS_MEMORY_LIMIT = int(os.getenv("SUBPROCESS_MEMORY_LIMIT_MB", "2048")) * 1024 * 1024
+
+# Processing that fails transiently (memory pressure, missing tools,
+# storage or database outages) is retried up to PROCESSING_MAX_RETRIES
+# times, after PROCESSING_RETRY_DELAY seconds doubling up to
+# PROCESSING_RETRY_MAX_DELAY. Documents that still fail are marked failed
+# until re-driven through POST /documents/redrive/. Documents whose status
+# has not moved in PROCESSING_STALL_HOURS are queued again by the
+# redrive_stalled_documents task.
+PROCESSING_MAX_RETRIES = int(os.getenv("PROCESSING_MAX_RETRIES", 5))
+PROCESSING_RETRY_DELAY = int(os.getenv("PROCESSING_RETRY_DELAY", 60))
+PROCESSING_RETRY_MAX_DELAY = int(os.getenv("PROCESSING_RETRY_MAX_DELAY", 3600))
+PROCESSING_STALL_HOURS = int(os.getenv("PROCESSING_STALL_HOURS", 24))
+
+# Page previews are rendered by the workers into an LRU cache under
+# THUMBNAIL_DIR/previews of at most PREVIEW_CACHE_SIZE bytes. Renders are
+# consumed from the "previews" queue by a worker of their own, whose
+# concurrency caps how many run at once (PREVIEW_RENDER_CONCURRENCY in
+# docker-compose.yml). The API waits up to PREVIEW_WAIT seconds for a render before answering 202
+# Accepted; the wait holds a web worker, so keep it well under a second.
+PREVIEW_CACHE_SIZE = int(os.getenv("PREVIEW_CACHE_SIZE_MB", 2048)) * 1024 * 1024
+PREVIEW_WAIT = float(os.getenv("PREVIEW_WAIT", 0.5))
+
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
-CELERY_TASK_SERIALIZER = "json"
\ No newline at end of file
+CELERY_TASK_SERIALIZER = "json"
+
+# Work is queued on the "interactive" or "bulk" queue (documents/priorities.py).
+# Uploads from the UI are interactive unless the caller asks otherwise;
+# imports, re-drives, backfills and maintenance are bulk. Page previews go
+# to the "previews" queue so a burst of prefetches never holds up uploads.
+# Keep some workers on `-Q interactive` so interactive work never waits
+# behind a backfill, and run the rest with `-Q interactive,bulk`: they
+# consume both queues in turn and so give bulk work the leftover capacity.
+# Workers reserve one task at a time, so a queued upload is never stuck
+# behind bulk tasks another worker prefetched.
+CELERY_TASK_DEFAULT_QUEUE = "bulk"
+CELERY_TASK_ROUTES = {
+    "documents.tasks.process_document": {"queue": "interactive"},
+    "documents.tasks.render_previews": {"queue": "previews"},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Processing events are published to Redis and streamed to clients as
+# Server-Sent Events by /api/documents/events/, for up to
+# SSE_MAX_DOCUMENTS documents per stream. A stream ends after
+# SSE_MAX_DURATION seconds and the browser reconnects.
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", CELERY_BROKER_URL)
+SSE_MAX_DURATION = int(os.getenv("SSE_MAX_DURATION", 300))
+SSE_MAX_DOCUMENTS = int(os.getenv("SSE_MAX_DOCUMENTS", 100))
@@ -31,6 +31,7 @@ from documents.views import (
     ProjectViewSet,
     DocumentTypeViewSet,
     NoteViewSet,
+    document_events,
 )
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
@@ -50,6 +51,8 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/register/', RegisterView.as_view(), name='register'),
     path('api/accounts/', include('accounts.urls')),
+    # Before the router, which would take "events" for a document id
+    path('api/documents/events/', document_events, name='document-events'),
     path('api/', include(router.urls)),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
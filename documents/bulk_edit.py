@@ -0,0 +1,54 @@
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from documents.models import Document
+
+BATCH_SIZE = 1000
+
+
+def batched_ids(queryset, batch_size=BATCH_SIZE):
+    """
+    Yield the primary keys of ``queryset`` in ascending batches without
+    loading the whole id list into memory.
+    """
+    ids = queryset.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=batch_size)
+    while batch := list(islice(ids, batch_size)):
+        yield batch
+
+
+def bulk_edit(queryset, add_tags=(), remove_tags=(), updates=None, batch_size=BATCH_SIZE):
+    """
+    Apply tag and field changes to every document in ``queryset`` with a few
+    set-based statements per batch instead of one save() per document.
+
+    ``updates`` maps Document field names (project, document_type,
+    correspondent) to their new value. Every touched document gets its
+    ``modified`` timestamp bumped. Each batch commits on its own so a large
+    edit never holds locks on the whole selection.
+    """
+    TagThrough = Document.tags.through
+    updates = dict(updates or {})
+    edited = 0
+
+    for batch in batched_ids(queryset, batch_size):
+        with transaction.atomic():
+            if remove_tags:
+                TagThrough.objects.filter(
+                    document_id__in=batch, tag_id__in=remove_tags
+                ).delete()
+            if add_tags:
+                TagThrough.objects.bulk_create(
+                    [
+                        TagThrough(document_id=document_id, tag_id=tag_id)
+                        for document_id in batch
+                        for tag_id in add_tags
+                    ],
+                    ignore_conflicts=True,
+                )
+            edited += Document.objects.filter(pk__in=batch).update(
+                modified=timezone.now(), **updates
+            )
+
+    return edited
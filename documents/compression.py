@@ -0,0 +1,136 @@
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from documents.storage import get_storage, ORIGINALS
+
+# Originals are stored as "<filename>.zst" once compressed.
+ZSTD_SUFFIX = ".zst"
+
+# Dictionaries live next to the originals so every node can load them.
+DICTIONARY_PREFIX = "dictionaries/"
+
+# Formats that are already compressed; compressing them again only burns CPU.
+INCOMPRESSIBLE_MIME_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "application/zip",
+    "application/gzip",
+    "application/zstd",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+}
+
+# Everything else is probed: the first SAMPLE_SIZE bytes are compressed at a
+# fast level and the file is only stored compressed if that saves at least
+# MIN_SAVINGS. This catches PDFs with compressed streams and zipped office
+# formats without reading the whole file.
+SAMPLE_SIZE = 256 * 1024
+MIN_SAVINGS = 0.1
+
+# A shared dictionary only pays off for small files.
+DICTIONARY_MAX_FILE_SIZE = 128 * 1024
+
+# Largest zstd frame header; it carries the dictionary id and content size.
+FRAME_HEADER_SIZE = 18
+
+
+def require_zstandard():
+    if zstandard is None:
+        raise ImproperlyConfigured("COMPRESS_ORIGINALS requires the zstandard package")
+
+
+def dictionary_name(dict_id):
+    return f"{DICTIONARY_PREFIX}{dict_id}.zdict"
+
+
+@cache
+def load_dictionary(dict_id):
+    with get_storage(ORIGINALS).open(dictionary_name(dict_id)) as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def worth_compressing(sample, mime_type):
+    """
+    Return whether a file of ``mime_type`` starting with ``sample`` (its
+    first ``SAMPLE_SIZE`` bytes) compresses well enough to store it
+    compressed.
+    """
+    require_zstandard()
+    if mime_type in INCOMPRESSIBLE_MIME_TYPES or mime_type.startswith(("video/", "audio/")):
+        return False
+    if not sample:
+        return False
+    compressed = zstandard.ZstdCompressor(level=1).compress(sample)
+    return len(compressed) <= len(sample) * (1 - MIN_SAVINGS)
+
+
+def compress_file(path, out, size):
+    """
+    Compress the ``size`` byte file at ``path`` into the binary file
+    ``out``. Small files use the dictionary set in ``ZSTD_DICTIONARY_ID``.
+    """
+    require_zstandard()
+    dict_data = None
+    if settings.ZSTD_DICTIONARY_ID and size <= DICTIONARY_MAX_FILE_SIZE:
+        dict_data = load_dictionary(settings.ZSTD_DICTIONARY_ID)
+    compressor = zstandard.ZstdCompressor(
+        level=settings.ZSTD_LEVEL, dict_data=dict_data, write_checksum=True
+    )
+    with open(path, "rb") as f:
+        compressor.copy_stream(f, out, size=size)
+
+
+class PrefixedStream:
+    """
+    Replay ``prefix`` before the rest of ``stream``, after the frame header
+    has been read to pick the dictionary.
+    """
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b""
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+def open_decompressed(stream):
+    """
+    Wrap the binary file ``stream`` holding a zstd frame in a reader that
+    yields the decompressed bytes. Closing the reader closes ``stream``.
+    """
+    require_zstandard()
+    header = stream.read(FRAME_HEADER_SIZE)
+    dict_id = zstandard.get_frame_parameters(header).dict_id
+    dict_data = load_dictionary(dict_id) if dict_id else None
+    decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+    return decompressor.stream_reader(PrefixedStream(header, stream), closefd=True)
+
+
+def content_size(stream):
+    """
+    Return the uncompressed size recorded in the zstd frame header.
+    """
+    require_zstandard()
+    with stream:
+        return zstandard.get_frame_parameters(stream.read(FRAME_HEADER_SIZE)).content_size
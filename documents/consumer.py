@@ -0,0 +1,301 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import magic
+from django.conf import settings
+from django.db import transaction
+
+from documents.models import Document, Tag
+from documents.serializers import PostDocumentSerializer
+from documents.storage import get_storage, ORIGINALS
+from documents.crypto import save_encrypted, ENCRYPTED_SUFFIX
+from documents.tasks import process_document
+from documents.priorities import BULK
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """
+    Return ``(path, md5, mime_type)`` for ``path``, or ``(path, None, None)``
+    if it cannot be read. Runs in the hashing process pool.
+    """
+    try:
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                md5.update(chunk)
+        return path, md5.hexdigest(), magic.from_file(path, mime=True)
+    except OSError as e:
+        logger.error(f"Cannot hash {path}: {e}")
+        return path, None, None
+
+
+class Checkpoint:
+    """
+    SQLite record of every file the consumer has seen, so an interrupted
+    import resumes without rehashing or re-importing anything.
+    """
+    HASHED = "hashed"
+    MOVED = "moved"
+    QUEUED = "queued"
+    DUPLICATE = "duplicate"
+    UNSUPPORTED = "unsupported"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime_ns INTEGER,"
+            " checksum TEXT,"
+            " mime_type TEXT,"
+            " state TEXT,"
+            " document_id INTEGER)"
+        )
+        self.db.commit()
+
+    def lookup(self, paths):
+        rows = self.db.execute(
+            f"SELECT path, size, mtime_ns, checksum, mime_type, state FROM files "
+            f"WHERE path IN ({','.join('?' * len(paths))})",
+            paths,
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def in_state(self, state):
+        return self.db.execute(
+            "SELECT path, checksum, document_id FROM files WHERE state = ?", (state,)
+        ).fetchall()
+
+    def record(self, rows):
+        """
+        Store ``(path, size, mtime_ns, checksum, mime_type, state, document_id)`` rows.
+        """
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.db.commit()
+
+    def set_state(self, paths, state, document_ids=None):
+        document_ids = document_ids or [None] * len(paths)
+        self.db.executemany(
+            "UPDATE files SET state = ?, document_id = COALESCE(?, document_id) WHERE path = ?",
+            [(state, document_id, path) for path, document_id in zip(paths, document_ids)],
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class Consumer:
+    """
+    Import every file below ``source`` into the archive.
+
+    Files are hashed in a process pool, deduplicated against
+    ``Document.checksum`` one batch at a time, moved into the originals
+    storage (a rename when both are on the same filesystem, or an encrypted
+    copy with ENCRYPT_DOCUMENTS) and queued for processing in bulk. Progress is kept in a ``Checkpoint``.
+    """
+
+    def __init__(
+        self, source, checkpoint, workers=None, batch_size=500, settle=0, tag_ids=(), project=None, priority=BULK,
+    ):
+        self.source = Path(source).resolve()
+        self.checkpoint = Checkpoint(checkpoint)
+        self.checkpoint_path = Path(checkpoint).resolve()
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.settle = settle
+        self.project = project
+        self.priority = priority
+        self.storage = get_storage(ORIGINALS)
+        self.tag_ids = list(tag_ids) + list(
+            Tag.objects.filter(is_inbox_tag=True).values_list("id", flat=True)
+        )
+
+    def scan(self):
+        """
+        Yield ``(path, size, mtime_ns)`` for every settled, visible file below
+        the source directory.
+        """
+        settled_before = time.time_ns() - self.settle * 1_000_000_000
+        for root, dirs, files in os.walk(self.source):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                path = os.path.join(root, name)
+                if name.startswith(".") or Path(path) == self.checkpoint_path:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime_ns <= settled_before:
+                    yield path, stat.st_size, stat.st_mtime_ns
+
+    def run(self):
+        self.stats = {
+            "imported": 0,
+            "duplicate": 0,
+            "unsupported": 0,
+            "failed": 0,
+        }
+        self.resume()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            files = self.scan()
+            while batch := list(islice(files, self.batch_size)):
+                self.consume_batch(batch, pool)
+        return self.stats
+
+    def resume(self):
+        """
+        Finish files an interrupted run moved but did not queue.
+        """
+        moved = self.checkpoint.in_state(Checkpoint.MOVED)
+
+        # A crash between moving a file and recording it leaves a hashed
+        # entry whose source is gone but whose document already exists.
+        for path, checksum, _ in self.checkpoint.in_state(Checkpoint.HASHED):
+            if os.path.exists(path):
+                continue
+            document = Document.global_objects.filter(checksum=checksum).first()
+            if document and self.storage.exists(document.source_name):
+                moved.append((path, checksum, document.id))
+            else:
+                self.checkpoint.set_state([path], Checkpoint.FAILED)
+
+        if moved:
+            logger.info(f"Queueing {len(moved)} documents left over from an interrupted run")
+            self.enqueue([path for path, _, _ in moved], [document_id for _, _, document_id in moved])
+
+    def consume_batch(self, batch, pool):
+        known = self.checkpoint.lookup([path for path, _, _ in batch])
+
+        hashed = []
+        to_hash = []
+        for path, size, mtime_ns in batch:
+            entry = known.get(path)
+            if entry and entry[:2] == (size, mtime_ns) and entry[4] != Checkpoint.FAILED:
+                if entry[4] == Checkpoint.HASHED:
+                    hashed.append((path, size, mtime_ns, entry[2], entry[3]))
+                # Otherwise already queued, a duplicate or unsupported.
+                continue
+            to_hash.append((path, size, mtime_ns))
+
+        chunksize = max(1, len(to_hash) // (self.workers * 4))
+        results = pool.map(hash_file, [path for path, _, _ in to_hash], chunksize=chunksize)
+        rows = []
+        for (path, size, mtime_ns), (_, checksum, mime_type) in zip(to_hash, results):
+            if checksum is None:
+                state = Checkpoint.FAILED
+            elif mime_type not in PostDocumentSerializer.SUPPORTED_MIME_TYPES:
+                state = Checkpoint.UNSUPPORTED
+            else:
+                state = Checkpoint.HASHED
+                hashed.append((path, size, mtime_ns, checksum, mime_type))
+            if state != Checkpoint.HASHED:
+                self.stats[state] += 1
+            rows.append((path, size, mtime_ns, checksum, mime_type, state, None))
+        self.checkpoint.record(rows)
+
+        if hashed:
+            self.import_files(hashed)
+
+    def import_files(self, hashed):
+        existing = dict(
+            Document.global_objects
+            .filter(checksum__in={checksum for _, _, _, checksum, _ in hashed})
+            .values_list("checksum", "filename")
+        )
+
+        new_documents = {}
+        duplicates = []
+        for path, size, mtime_ns, checksum, mime_type in hashed:
+            name = os.path.basename(path)
+            filename = f"{checksum}_{name}"
+            # An interrupted run may have registered the document without
+            # moving its file yet.
+            stored_name = filename + ENCRYPTED_SUFFIX if settings.ENCRYPT_DOCUMENTS else filename
+            resumed = existing.get(checksum) == filename and not self.storage.exists(stored_name)
+            if checksum in new_documents or (checksum in existing and not resumed):
+                duplicates.append(path)
+            else:
+                new_documents[checksum] = (path, Document(
+                    filename=filename,
+                    original_filename=name,
+                    title=Path(name).stem,
+                    project_id=self.project,
+                    mime_type=mime_type,
+                    storage_type=(
+                        Document.STORAGE_TYPE_GPG if settings.ENCRYPT_DOCUMENTS
+                        else Document.STORAGE_TYPE_UNENCRYPTED
+                    ),
+                    checksum=checksum,
+                ))
+
+        if duplicates:
+            self.checkpoint.set_state(duplicates, Checkpoint.DUPLICATE)
+            self.stats["duplicate"] += len(duplicates)
+        if not new_documents:
+            return
+
+        with transaction.atomic():
+            Document.objects.bulk_create(
+                [document for checksum, (_, document) in new_documents.items() if checksum not in existing]
+            )
+            document_ids = dict(
+                Document.global_objects
+                .filter(checksum__in=new_documents.keys())
+                .values_list("checksum", "id")
+            )
+            if self.tag_ids:
+                TagThrough = Document.tags.through
+                TagThrough.objects.bulk_create(
+                    [
+                        TagThrough(document_id=document_id, tag_id=tag_id)
+                        for document_id in document_ids.values()
+                        for tag_id in self.tag_ids
+                    ],
+                    ignore_conflicts=True,
+                )
+
+        moved_paths = []
+        moved_ids = []
+        for checksum, (path, document) in new_documents.items():
+            try:
+                if document.is_encrypted:
+                    with open(path, "rb") as f:
+                        save_encrypted(self.storage, document.source_name, f)
+                    os.unlink(path)
+                else:
+                    self.storage.save_file(document.source_name, path, move=True)
+            except Exception as e:
+                logger.error(f"Cannot move {path} into storage: {e}")
+                self.checkpoint.set_state([path], Checkpoint.FAILED)
+                self.stats["failed"] += 1
+                continue
+            moved_paths.append(path)
+            moved_ids.append(document_ids[checksum])
+        self.checkpoint.set_state(moved_paths, Checkpoint.MOVED, moved_ids)
+
+        self.enqueue(moved_paths, moved_ids)
+
+    def enqueue(self, paths, document_ids):
+        with process_document.app.producer_or_acquire() as producer:
+            for document_id in document_ids:
+                process_document.apply_async((document_id,), producer=producer, queue=self.priority)
+        self.checkpoint.set_state(paths, Checkpoint.QUEUED)
+        self.stats["imported"] += len(document_ids)
+
+    def close(self):
+        self.checkpoint.close()
@@ -0,0 +1,226 @@
+import io
+import os
+import struct
+import tempfile
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Encrypted files are a header followed by the plaintext in CHUNK_SIZE
+# chunks, each sealed with AES-256-GCM:
+#
+#   header:  MAGIC (4 bytes) | salt (16 bytes)
+#   chunk i: ciphertext of up to CHUNK_SIZE bytes | 16 byte tag
+#
+# Every file gets its own key, derived with HKDF from ENCRYPTION_KEY and
+# the salt. Chunk nonces follow the STREAM construction: the chunk index
+# plus a flag marking the final chunk, so chunks cannot be reordered,
+# dropped or truncated without failing authentication. The header is
+# authenticated as associated data of every chunk. Because chunk
+# boundaries are fixed, any byte range can be decrypted on its own.
+MAGIC = b"DAE\x01"
+CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+HEADER = struct.Struct(">4s16s")
+HEADER_SIZE = HEADER.size
+ENCRYPTED_CHUNK_SIZE = CHUNK_SIZE + TAG_SIZE
+
+# Encrypted files are stored as "<name>.gpg", the suffix the GPG storage
+# type has always used.
+ENCRYPTED_SUFFIX = ".gpg"
+
+
+class DecryptionError(IOError):
+    pass
+
+
+def file_key(salt):
+    if not settings.ENCRYPTION_KEY:
+        raise ImproperlyConfigured("Encrypted storage requires ENCRYPTION_KEY")
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b"document-archive storage",
+    ).derive(settings.ENCRYPTION_KEY.encode())
+    return AESGCM(key)
+
+
+def chunk_nonce(index, last):
+    return struct.pack(">xxxQ?", index, last)
+
+
+def read_full(stream, size):
+    """
+    Read exactly ``size`` bytes unless the stream ends first; network
+    streams may return short reads.
+    """
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def chunk_count(ciphertext_size):
+    body = ciphertext_size - HEADER_SIZE
+    return max(1, -(-body // ENCRYPTED_CHUNK_SIZE))
+
+
+def plaintext_size(ciphertext_size):
+    """
+    Return the size of the plaintext of a ``ciphertext_size`` byte file.
+    """
+    body = ciphertext_size - HEADER_SIZE
+    chunks = chunk_count(ciphertext_size)
+    last = body - (chunks - 1) * ENCRYPTED_CHUNK_SIZE
+    # Only an empty file ends in a chunk without plaintext. Such a chunk
+    # would never be read, so the cut would go unnoticed.
+    if last < TAG_SIZE or (last == TAG_SIZE and chunks > 1):
+        raise DecryptionError("Encrypted file is truncated")
+    return body - chunks * TAG_SIZE
+
+
+def encrypt_stream(src, dst):
+    """
+    Encrypt the binary file ``src`` into ``dst`` one chunk at a time.
+    """
+    salt = os.urandom(16)
+    header = HEADER.pack(MAGIC, salt)
+    aead = file_key(salt)
+    dst.write(header)
+
+    index = 0
+    chunk = read_full(src, CHUNK_SIZE)
+    while True:
+        # Look ahead one chunk to know whether this one is the last.
+        next_chunk = read_full(src, CHUNK_SIZE) if len(chunk) == CHUNK_SIZE else b""
+        last = not next_chunk
+        dst.write(aead.encrypt(chunk_nonce(index, last), chunk, header))
+        if last:
+            return
+        chunk = next_chunk
+        index += 1
+
+
+def save_encrypted(storage, name, content):
+    """
+    Encrypt ``content`` (bytes or a binary file object) and store it as
+    ``name`` in ``storage``.
+    """
+    if isinstance(content, bytes):
+        content = io.BytesIO(content)
+    with tempfile.TemporaryFile() as encrypted:
+        encrypt_stream(content, encrypted)
+        encrypted.seek(0)
+        storage.save(name, encrypted)
+
+
+def encrypt_bytes(data):
+    encrypted = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), encrypted)
+    return encrypted.getvalue()
+
+
+def is_encrypted_data(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+class DecryptingReader(io.RawIOBase):
+    """
+    Seekable reader over the plaintext of an encrypted file.
+
+    ``opener(offset)`` must return the encrypted file positioned at
+    ``offset``; it is called again whenever a seek leaves the chunk being
+    read, so only the chunks covering the requested range are fetched and
+    decrypted. Memory use is one chunk regardless of the file size.
+    """
+
+    def __init__(self, opener, ciphertext_size):
+        self.opener = opener
+        self.size = plaintext_size(ciphertext_size)
+        self.chunks = chunk_count(ciphertext_size)
+        self.stream = opener(0)
+        self.header = read_full(self.stream, HEADER_SIZE)
+        magic, salt = HEADER.unpack(self.header)
+        if magic != MAGIC:
+            raise DecryptionError("Not an encrypted document file")
+        self.aead = file_key(salt)
+        self.stream_chunk = 0
+        self.buffer = b""
+        self.buffer_chunk = None
+        self.position = 0
+        if self.size == 0:
+            # Authenticate the empty final chunk so truncation is detected.
+            self.load_chunk(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.position = offset
+        return self.position
+
+    def load_chunk(self, index):
+        if index != self.stream_chunk:
+            self.stream.close()
+            self.stream = self.opener(HEADER_SIZE + index * ENCRYPTED_CHUNK_SIZE)
+            self.stream_chunk = index
+        data = read_full(self.stream, ENCRYPTED_CHUNK_SIZE)
+        try:
+            self.buffer = self.aead.decrypt(chunk_nonce(index, index == self.chunks - 1), data, self.header)
+        except InvalidTag:
+            raise DecryptionError(f"Chunk {index} failed authentication")
+        self.buffer_chunk = index
+        self.stream_chunk = index + 1
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        pieces = []
+        while size > 0 and self.position < self.size:
+            index, offset = divmod(self.position, CHUNK_SIZE)
+            if self.buffer_chunk != index:
+                self.load_chunk(index)
+            piece = self.buffer[offset:offset + size]
+            pieces.append(piece)
+            self.position += len(piece)
+            size -= len(piece)
+        return b"".join(pieces)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+
+def open_encrypted(storage, name):
+    return DecryptingReader(lambda offset: storage.open(name, offset), storage.size(name))
+
+
+def decrypt_bytes(data):
+    with DecryptingReader(lambda offset: io.BytesIO(data[offset:]), len(data)) as reader:
+        return reader.read()
@@ -0,0 +1,117 @@
+import json
+import logging
+import time
+from functools import cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from documents.models import Document
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "document-events:"
+
+# Processing events, in the order a document goes through them
+QUEUED = "queued"
+CONVERTING = "converting"
+THUMBNAILING = "thumbnailing"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+FINAL_EVENTS = {DONE, FAILED}
+
+# Sent as an SSE comment when nothing happened, so proxies keep the
+# connection open
+KEEPALIVE_SECONDS = 15
+
+
+def channel(document_id):
+    return f"{CHANNEL_PREFIX}{document_id}"
+
+
+@cache
+def redis_client():
+    return redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+
+
+def publish_event(document_id, event, **data):
+    """
+    Publish a processing event of ``document_id`` to its Redis channel.
+    Delivery is best effort: a Redis outage must not fail processing, and
+    clients read the current state when they connect.
+    """
+    message = json.dumps({"document": document_id, "event": event, **data})
+    try:
+        redis_client().publish(channel(document_id), message)
+    except redis.RedisError as e:
+        logger.warning(f"Cannot publish {event} event of document {document_id}: {str(e)}")
+
+
+async def current_events(document_ids):
+    """
+    Yield an event message describing where each of ``document_ids`` is
+    in processing now.
+    """
+    documents = Document.objects.filter(pk__in=document_ids).values(
+        "id", "processing_status", "archive_filename", "failure_reason",
+    )
+    async for document in documents:
+        event = document["processing_status"]
+        if event == Document.PROCESSING_RUNNING:
+            event = THUMBNAILING if document["archive_filename"] else CONVERTING
+        message = {"document": document["id"], "event": event}
+        if event == FAILED:
+            message["reason"] = document["failure_reason"]
+        yield message
+
+
+def format_event(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message)}\n\n"
+
+
+async def event_stream(document_ids):
+    """
+    Yield Server-Sent Events for ``document_ids`` until every document
+    reached a final event or SSE_MAX_DURATION passed; EventSource then
+    reconnects on its own.
+
+    The stream starts with the current state of every document, read
+    after subscribing so that no event is lost in between.
+    """
+    client = redis.asyncio.Redis.from_url(settings.EVENTS_REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(*map(channel, document_ids))
+        pending = set(document_ids)
+        yield "retry: 5000\n\n"
+
+        found = set()
+        async for message in current_events(document_ids):
+            found.add(message["document"])
+            if message["event"] in FINAL_EVENTS:
+                pending.discard(message["document"])
+            yield format_event(message)
+        # Unknown documents will never send anything
+        pending &= found
+
+        deadline = time.monotonic() + settings.SSE_MAX_DURATION
+        last_sent = time.monotonic()
+        while pending and time.monotonic() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                # Also returned early for subscribe confirmations
+                if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+            message = json.loads(message["data"])
+            if message["event"] in FINAL_EVENTS:
+                pending.discard(message["document"])
+            last_sent = time.monotonic()
+            yield format_event(message)
+    finally:
+        # Also runs when the client disconnects and the generator is closed
+        await pubsub.aclose()
+        await client.aclose()
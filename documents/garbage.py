@@ -0,0 +1,72 @@
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from documents.scrubber import find_orphans, REFERENCED
+from documents.storage import get_storage, QUARANTINE_PREFIX
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+QUARANTINE = "quarantine"
+DELETE = "delete"
+
+
+def quarantine_name(name, day):
+    return f"{QUARANTINE_PREFIX}{day.isoformat()}/{name}"
+
+
+def collect_garbage(area, grace=timedelta(hours=24), action=QUARANTINE, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Remove files in the ``area`` storage that no document refers to and
+    that are older than ``grace``, and yield ``(name, size)`` for each.
+
+    The grace period protects uploads whose file is written before their
+    document row. Each batch is checked against the database again right
+    before anything is touched. With ``action=QUARANTINE`` files are moved
+    under ``quarantine/<date>/`` in the same storage instead of deleted.
+    """
+    storage = get_storage(area)
+    cutoff = timezone.now() - grace
+    today = timezone.localdate()
+
+    orphans = (
+        (name, size) for name, size, modified in find_orphans(area, batch_size)
+        if modified < cutoff
+    )
+    while batch := list(islice(orphans, batch_size)):
+        if not dry_run:
+            referenced = REFERENCED[area]([name for name, _ in batch])
+            batch = [(name, size) for name, size in batch if name not in referenced]
+
+        for name, size in batch:
+            if not dry_run:
+                try:
+                    if action == QUARANTINE:
+                        storage.move(name, quarantine_name(name, today))
+                    else:
+                        storage.delete(name)
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    logger.error(f"Cannot {action} {area}/{name}: {e}")
+                    continue
+            yield name, size
+
+
+def purge_quarantine(area, older_than, dry_run=False):
+    """
+    Delete quarantined files set aside more than ``older_than`` ago and
+    yield ``(name, size)`` for each.
+    """
+    storage = get_storage(area)
+    cutoff = timezone.localdate() - older_than
+    for name, size, _ in storage.listdir(QUARANTINE_PREFIX):
+        day = name[len(QUARANTINE_PREFIX):].split("/", 1)[0]
+        if day < cutoff.isoformat():
+            if not dry_run:
+                storage.delete(name)
+            yield name, size
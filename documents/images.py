@@ -0,0 +1,157 @@
+import zlib
+
+from PIL import Image, ImageOps, ImageSequence
+
+# Raster formats wrapped into a PDF directly instead of through LibreOffice
+IMAGE_MIME_TYPES = {
+    'image/jpeg',
+    'image/png',
+    'image/tiff',
+    'image/gif',
+    'image/webp',
+}
+
+# Assumed when an image carries no usable resolution
+DEFAULT_DPI = 96
+
+# EXIF orientation: page rotation that displays a JPEG upright without
+# decoding it. Mirrored orientations are decoded and transposed instead.
+EXIF_ROTATION = {1: 0, 3: 180, 6: 90, 8: 270}
+
+COLOR_SPACES = {'1': '/DeviceGray', 'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+
+def image_resolution(image):
+    """
+    Return the horizontal and vertical resolution of ``image`` in dpi.
+    """
+    dpi = image.info.get('dpi')
+    try:
+        x, y = (float(v) for v in dpi)
+    except (TypeError, ValueError):
+        return DEFAULT_DPI, DEFAULT_DPI
+    # Some writers store 1x1 or 0x0 to mean "unknown"
+    if x < 10 or y < 10:
+        return DEFAULT_DPI, DEFAULT_DPI
+    return x, y
+
+
+def jpeg_passthrough(image):
+    """
+    Return the page rotation under which the JPEG ``image`` can be embedded
+    as it is, or None when it has to be decoded.
+    """
+    if image.format != 'JPEG' or image.mode not in ('L', 'RGB'):
+        # Adobe CMYK JPEGs are stored inverted
+        return None
+    return EXIF_ROTATION.get(image.getexif().get(0x0112, 1))
+
+
+def flate_image(image):
+    """
+    Return ``(image, data)`` with the pixels of ``image`` losslessly
+    deflated. Transparency is flattened onto white, palettes are expanded
+    and 16 bit samples reduced to 8 bit.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode.startswith('I'):
+        image = image.convert('I').point(lambda v: v / 256).convert('L')
+    elif image.mode not in COLOR_SPACES:
+        image = image.convert('RGB')
+    return image, zlib.compress(image.tobytes(), 6)
+
+
+def page_images(image):
+    """
+    Yield ``(image dictionary, data, width, height, rotation)`` for every
+    page of ``image``, width and height in points. Frames are decoded one
+    at a time as the generator advances.
+    """
+    rotation = jpeg_passthrough(image)
+    if rotation is not None:
+        with open(image.filename, 'rb') as f:
+            frames = [(image, image_resolution(image), f.read(), '/DCTDecode')]
+    else:
+        rotation = 0
+        frames = flate_frames(image)
+
+    for frame, (x_dpi, y_dpi), data, compression in frames:
+        bits = 1 if frame.mode == '1' else 8
+        dictionary = (
+            f"<< /Type /XObject /Subtype /Image /Width {frame.width} /Height {frame.height} "
+            f"/ColorSpace {COLOR_SPACES[frame.mode]} /BitsPerComponent {bits} "
+            f"/Filter {compression} /Length {len(data)} >>"
+        )
+        yield dictionary, data, frame.width * 72 / x_dpi, frame.height * 72 / y_dpi, rotation
+
+
+def flate_frames(image):
+    for frame in ImageSequence.Iterator(image):
+        # The resolution is lost when transparency is flattened
+        dpi = image_resolution(frame)
+        frame, data = flate_image(frame)
+        yield frame, dpi, data, '/FlateDecode'
+
+
+# The catalog and page tree are written last but numbered first, so that
+# pages can refer to their parent as they are written
+CATALOG_REF = 1
+PAGES_REF = 2
+
+
+def image_to_pdf(source_path, output_path):
+    """
+    Write the image at ``source_path`` to ``output_path`` as a PDF with
+    one page per frame, sized after the image resolution.
+
+    JPEGs are embedded without re-encoding; every other format is stored
+    losslessly with Flate compression. Each page is written as soon as its
+    frame is decoded, so only one frame is held in memory. Returns the
+    number of pages.
+    """
+    offsets = {}
+    kids = []
+
+    with Image.open(source_path) as image, open(output_path, 'wb') as f:
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        def write_object(number, *parts):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number)
+            for part in parts:
+                f.write(part)
+            f.write(b"\nendobj\n")
+
+        number = PAGES_REF
+        for dictionary, data, width, height, rotation in page_images(image):
+            image_ref, content_ref, page_ref = number + 1, number + 2, number + 3
+            number = page_ref
+            write_object(image_ref, dictionary.encode(), b"\nstream\n", data, b"\nendstream")
+            # Released before the next frame is decoded
+            del data
+            content = f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode()
+            write_object(content_ref, b"<< /Length %d >>\nstream\n" % len(content), content, b"\nendstream")
+            write_object(page_ref, (
+                f"<< /Type /Page /Parent {PAGES_REF} 0 R /MediaBox [0 0 {width:.4f} {height:.4f}] "
+                f"/Rotate {rotation} /Resources << /XObject << /Im0 {image_ref} 0 R >> >> "
+                f"/Contents {content_ref} 0 R >>"
+            ).encode())
+            kids.append(f"{page_ref} 0 R")
+
+        write_object(PAGES_REF, f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode())
+        write_object(CATALOG_REF, f"<< /Type /Catalog /Pages {PAGES_REF} 0 R >>".encode())
+
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (number + 1))
+        for n in range(1, number + 1):
+            f.write(b"%010d 00000 n \n" % offsets[n])
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            number + 1, CATALOG_REF, xref,
+        ))
+    return len(kids)
@@ -0,0 +1,83 @@
+import base64
+import gzip
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from document_archive.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serialization time and bytes on the wire of JSONRenderer and "
+        "ORJSONRenderer for a page of documents."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=1000, help="Documents per page.")
+        parser.add_argument("--repeat", type=int, default=20, help="Renders per renderer; the best is reported.")
+        parser.add_argument(
+            "--thumbnail-bytes",
+            type=int,
+            default=0,
+            help="Size of the random thumbnail embedded per document as thumbnail_str. "
+                 "0 leaves thumbnails out, as with ?expand=.",
+        )
+
+    def handle(self, *args, **options):
+        page = self.build_page(options["documents"], options["thumbnail_bytes"])
+
+        rows = []
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                body = renderer.render(page, "application/json")
+                timings.append(time.perf_counter() - start)
+            rows.append((
+                type(renderer).__name__,
+                min(timings) * 1000,
+                len(body),
+                # nginx serves with gzip_comp_level 5.
+                len(gzip.compress(body, compresslevel=5)),
+            ))
+
+        self.stdout.write(f"{'renderer':<16}{'render ms':>12}{'bytes':>14}{'gzip bytes':>14}")
+        for name, millis, size, gzip_size in rows:
+            self.stdout.write(f"{name:<16}{millis:>12.2f}{size:>14}{gzip_size:>14}")
+
+        baseline, candidate = rows
+        self.stdout.write(
+            f"speedup {baseline[1] / candidate[1]:.1f}x, "
+            f"gzip saves {100 - 100 * candidate[3] / candidate[2]:.0f}% on the wire"
+        )
+
+    def build_page(self, count, thumbnail_bytes):
+        """
+        Build a page shaped like the paginated DocumentListSerializer output.
+        """
+        now = timezone.now()
+        results = []
+        for pk in range(1, count + 1):
+            row = {
+                "id": pk,
+                "title": f"Scanned invoice {pk} for project {pk % 50}",
+                "tags": random.sample(range(1, 200), random.randint(0, 5)),
+                "created_date": now - timedelta(days=random.randint(0, 3650), seconds=pk),
+                "page_count": random.randint(1, 40),
+            }
+            if thumbnail_bytes:
+                row["thumbnail_str"] = base64.b64encode(os.urandom(thumbnail_bytes)).decode("utf-8")
+            results.append(row)
+
+        return {
+            "count": count * 10,
+            "next": "http://localhost/api/documents/?page=2",
+            "previous": None,
+            "results": results,
+        }
@@ -0,0 +1,69 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from documents.garbage import collect_garbage, purge_quarantine, DELETE, QUARANTINE
+from documents.storage import AREAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Find originals, archives and thumbnails that no document refers to, "
+        "such as files left by failed uploads or processing, and move them "
+        "to quarantine (or delete them) once they are older than the grace "
+        "period. Use --dry-run to only report them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--area",
+            choices=AREAS,
+            nargs="+",
+            default=list(AREAS),
+            help="Storage areas to collect (default: all).",
+        )
+        parser.add_argument("--grace-hours", type=int, default=24, help="Leave files younger than this alone.")
+        parser.add_argument("--delete", action="store_true", help="Delete orphans instead of quarantining them.")
+        parser.add_argument(
+            "--purge-quarantine",
+            type=int,
+            metavar="DAYS",
+            help="Also delete files quarantined more than DAYS days ago.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be done without touching files.")
+        parser.add_argument("--report", help="Write every affected file to this file as JSON lines.")
+
+    def handle(self, *args, **options):
+        action = DELETE if options["delete"] else QUARANTINE
+        report = open(options["report"], "w") if options["report"] else self.stdout
+
+        try:
+            for area in options["area"]:
+                count = total = 0
+                for name, size in collect_garbage(
+                    area,
+                    grace=timedelta(hours=options["grace_hours"]),
+                    action=action,
+                    dry_run=options["dry_run"],
+                ):
+                    report.write(json.dumps({"area": area, "name": name, "size": size, "action": action}) + "\n")
+                    count += 1
+                    total += size
+
+                purged = 0
+                if options["purge_quarantine"] is not None:
+                    for name, size in purge_quarantine(
+                        area, timedelta(days=options["purge_quarantine"]), dry_run=options["dry_run"]
+                    ):
+                        report.write(json.dumps({"area": area, "name": name, "size": size, "action": "purge"}) + "\n")
+                        purged += 1
+
+                verb = "would" if options["dry_run"] else "did"
+                self.stdout.write(
+                    f"{area}: {verb} {action} {count} files ({total / 1e6:.1f} MB), "
+                    f"{verb} purge {purged} quarantined files"
+                )
+        finally:
+            if options["report"]:
+                report.close()
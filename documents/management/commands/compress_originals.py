@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from documents.bulk_edit import batched_ids
+from documents.models import Document
+from documents.priorities import PRIORITIES, BULK
+from documents.tasks import compress_original
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue zstd compression of every uncompressed original. The task "
+        "probes a sample of each file first and leaves files that do not "
+        "compress well (JPEG, compressed PDFs, ...) untouched and skips them on "
+        "later runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Queue at most this many documents.")
+        parser.add_argument(
+            "--priority",
+            choices=PRIORITIES,
+            default=BULK,
+            help="Queue the work is processed from (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Document.objects.filter(compression=Document.COMPRESSION_NONE, compression_probed=False)
+        limit = options["limit"]
+
+        queued = 0
+        with compress_original.app.producer_or_acquire() as producer:
+            for batch in batched_ids(queryset):
+                if limit:
+                    batch = batch[:limit - queued]
+                for document_id in batch:
+                    compress_original.apply_async((document_id,), producer=producer, queue=options["priority"])
+                queued += len(batch)
+                if limit and queued >= limit:
+                    break
+
+        self.stdout.write(f"Queued {queued} documents for compression")
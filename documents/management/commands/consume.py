@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.consumer import Consumer
+from documents.priorities import PRIORITIES, BULK
+
+
+class Command(BaseCommand):
+    help = (
+        "Import every file below a directory tree. Files are hashed in "
+        "parallel, deduplicated against existing documents, moved into "
+        "the originals storage and queued for processing. Progress is checkpointed, "
+        "so an interrupted import resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory to import from.")
+        parser.add_argument(
+            "--checkpoint",
+            default="consume-checkpoint.sqlite3",
+            help="SQLite file recording progress (default: %(default)s).",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: CPU count).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Files per deduplication batch.")
+        parser.add_argument("--tags", type=int, nargs="+", default=[], help="Tag ids for every imported document.")
+        parser.add_argument("--project", type=int, help="Project id for every imported document.")
+        parser.add_argument(
+            "--priority",
+            choices=PRIORITIES,
+            default=BULK,
+            help="Queue the work is processed from (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running and rescan the directory every --interval seconds.",
+        )
+        parser.add_argument("--interval", type=int, default=30, help="Seconds between scans with --watch.")
+        parser.add_argument(
+            "--settle",
+            type=int,
+            default=None,
+            help="Skip files modified in the last N seconds, as they may still be "
+                 "being written (default: 10 with --watch, otherwise 0).",
+        )
+
+    def handle(self, *args, **options):
+        settle = options["settle"]
+        if settle is None:
+            settle = 10 if options["watch"] else 0
+
+        try:
+            consumer = Consumer(
+                options["source"],
+                options["checkpoint"],
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                settle=settle,
+                tag_ids=options["tags"],
+                project=options["project"],
+                priority=options["priority"],
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            while True:
+                started = time.monotonic()
+                stats = consumer.run()
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{stats['imported']} imported, {stats['duplicate']} duplicates, "
+                    f"{stats['unsupported']} unsupported, {stats['failed']} failed "
+                    f"in {elapsed:.1f}s"
+                )
+                if not options["watch"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            consumer.close()
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.storage import AREAS, LocalStorage, get_storage, ORIGINALS, ARCHIVE, THUMBNAILS
+from documents.thumbnails import PACK_PREFIX
+from documents.previews import PREVIEW_PREFIX
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy originals, archives and thumbnails from the local directories "
+        "(ORIGINAL_DIR, ARCHIVE_DIR, THUMBNAIL_DIR) into the configured "
+        "STORAGE_BACKEND. Files already present with the same size are "
+        "skipped, so the copy can be rerun until it is complete."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent uploads.")
+        parser.add_argument(
+            "--area",
+            choices=AREAS,
+            nargs="+",
+            default=list(AREAS),
+            help="Storage areas to copy (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        roots = {
+            ORIGINALS: settings.ORIGINAL_DIR,
+            ARCHIVE: settings.ARCHIVE_DIR,
+            THUMBNAILS: settings.THUMBNAIL_DIR,
+        }
+        for area in options["area"]:
+            source = LocalStorage(roots[area])
+            target = get_storage(area)
+
+            def copy(entry):
+                name, size, _ = entry
+                try:
+                    if target.size(name) == size:
+                        return False
+                except FileNotFoundError:
+                    pass
+                target.save_file(name, source.path(name))
+                return True
+
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                # Thumbnail packs and the preview cache are local by design
+                # and not copied.
+                results = list(pool.map(copy, (
+                    entry for entry in source.listdir()
+                    if not entry[0].startswith((PACK_PREFIX, PREVIEW_PREFIX))
+                )))
+
+            self.stdout.write(
+                f"{area}: {sum(results)} copied, {len(results) - sum(results)} already present"
+            )
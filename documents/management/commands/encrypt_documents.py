@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.bulk_edit import batched_ids
+from documents.crypto import encrypt_bytes, is_encrypted_data, save_encrypted, ENCRYPTED_SUFFIX
+from documents.models import Document
+from documents.storage import get_storage
+from documents.thumbnails import thumbnail_pack
+from documents.trash import stored_files
+
+# Documents no worker is writing files of
+SETTLED_STATUSES = (Document.PROCESSING_DONE, Document.PROCESSING_FAILED)
+
+
+def encrypt_files(document):
+    """
+    Write an encrypted copy of every stored file of ``document`` and return
+    the ``(area, name)`` of the plain files it replaces.
+    """
+    replaced = []
+    for area, name in stored_files(document):
+        storage = get_storage(area)
+        try:
+            with storage.open(name) as f:
+                save_encrypted(storage, name + ENCRYPTED_SUFFIX, f)
+        except FileNotFoundError:
+            continue
+        replaced.append((area, name))
+
+    if settings.PACK_THUMBNAILS:
+        pack = thumbnail_pack()
+        data = pack.get(document.pk)
+        if data is not None and not is_encrypted_data(data):
+            pack.put(document.pk, encrypt_bytes(data))
+    return replaced
+
+
+class Command(BaseCommand):
+    help = (
+        "Encrypt the stored files of every unencrypted document in place. "
+        "Documents still queued or being processed are left for a later run. "
+        "Encrypted copies are written first; a document is switched to the "
+        "encrypted storage type and its plain files deleted only once all of "
+        "its copies exist, so the command can be interrupted and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Documents encrypted in parallel.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Documents switched per update.")
+        parser.add_argument("--limit", type=int, help="Encrypt at most this many documents.")
+
+    def handle(self, *args, **options):
+        if not settings.ENCRYPTION_KEY:
+            raise CommandError("ENCRYPTION_KEY is not set")
+
+        queryset = Document.global_objects.filter(
+            storage_type=Document.STORAGE_TYPE_UNENCRYPTED,
+            processing_status__in=SETTLED_STATUSES,
+        )
+        limit = options["limit"]
+
+        encrypted = 0
+        failed = 0
+        skipped = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for batch in batched_ids(queryset, options["batch_size"]):
+                if limit:
+                    batch = batch[:limit - encrypted - failed - skipped]
+                documents = list(Document.global_objects.filter(pk__in=batch).only(
+                    "id", "filename", "archive_filename", "storage_type", "compression",
+                ))
+
+                replaced = {}
+                futures = [(document, pool.submit(encrypt_files, document)) for document in documents]
+                for document, future in futures:
+                    try:
+                        replaced[document.pk] = future.result()
+                    except Exception as e:
+                        self.stderr.write(f"Cannot encrypt document {document.pk}: {e}")
+                        failed += 1
+
+                # update() leaves the modified timestamp alone. Documents
+                # re-queued meanwhile may get new plain files from a worker;
+                # they stay unencrypted and are picked up by the next run.
+                Document.global_objects.filter(
+                    pk__in=replaced, processing_status__in=SETTLED_STATUSES,
+                ).update(storage_type=Document.STORAGE_TYPE_GPG)
+                switched = set(Document.global_objects.filter(
+                    pk__in=replaced, storage_type=Document.STORAGE_TYPE_GPG,
+                ).values_list("pk", flat=True))
+                for pk in switched:
+                    for area, name in replaced[pk]:
+                        get_storage(area).delete(name)
+                encrypted += len(switched)
+                skipped += len(replaced) - len(switched)
+
+                if limit and encrypted + failed + skipped >= limit:
+                    break
+
+        self.stdout.write(f"Encrypted {encrypted} documents, {failed} failed, {skipped} skipped while being processed")
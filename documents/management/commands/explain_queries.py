@@ -0,0 +1,166 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from documents.models import (
+    Correspondent,
+    Document,
+    DocumentType,
+    Note,
+    Project,
+    Tag,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the canonical API queries and flag sequential scans "
+        "on the documents tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Insert this many synthetic documents before explaining. "
+                 "The seeded rows are rolled back afterwards.",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Use EXPLAIN ANALYZE instead of plain EXPLAIN.",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Exit with an error if any query uses a sequential scan.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("explain_queries requires a PostgreSQL database")
+
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            flagged = []
+            for label, queryset in self.canonical_queries():
+                plan = queryset.explain(analyze=options["analyze"])
+                seq_scans = [
+                    line.strip() for line in plan.splitlines()
+                    if "Seq Scan on documents_" in line
+                ]
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(plan)
+                if seq_scans:
+                    flagged.append(label)
+                    for line in seq_scans:
+                        self.stdout.write(self.style.WARNING(f"  sequential scan: {line}"))
+                self.stdout.write("")
+
+            transaction.set_rollback(True)
+
+        if flagged:
+            message = f"{len(flagged)} queries use sequential scans: {', '.join(flagged)}"
+            if options["strict"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No sequential scans on documents tables"))
+
+    def canonical_queries(self):
+        document = Document.objects.order_by("?").first()
+        project = Project.objects.first()
+        document_type = DocumentType.objects.first()
+        correspondent = Correspondent.objects.first()
+        tag = Tag.objects.first()
+
+        queries = [
+            ("document list", Document.objects.all()[:100]),
+            ("document list by added", Document.objects.order_by("-added")[:100]),
+        ]
+        if project:
+            queries.append(
+                ("documents by project", Document.objects.filter(project=project)[:100])
+            )
+        if document_type:
+            queries.append(
+                ("documents by document type", Document.objects.filter(document_type=document_type)[:100])
+            )
+        if correspondent:
+            queries.append(
+                ("documents by correspondent", Document.objects.filter(correspondent=correspondent)[:100])
+            )
+        if tag:
+            queries.append(
+                ("documents by tag", Document.objects.filter(tags__id=tag.id)[:100])
+            )
+        if document:
+            queries.append(
+                ("document detail", Document.objects.filter(pk=document.pk))
+            )
+            queries.append(
+                ("document by checksum", Document.objects.filter(checksum=document.checksum))
+            )
+            queries.append(
+                ("notes for document", Note.objects.filter(document=document))
+            )
+        return queries
+
+    def seed(self, count):
+        self.stdout.write(f"Seeding {count} documents...")
+        projects = Project.objects.bulk_create(
+            Project(title=f"Project {i}") for i in range(50)
+        )
+        document_types = DocumentType.objects.bulk_create(
+            DocumentType(name=f"Type {i}") for i in range(20)
+        )
+        correspondents = Correspondent.objects.bulk_create(
+            Correspondent(name=f"Correspondent {i}") for i in range(200)
+        )
+        tags = Tag.objects.bulk_create(Tag(name=f"Tag {i}") for i in range(100))
+
+        now = timezone.now()
+        documents = Document.objects.bulk_create(
+            (
+                Document(
+                    title=f"Document {i}",
+                    project=random.choice(projects),
+                    document_type=random.choice(document_types),
+                    correspondent=random.choice(correspondents),
+                    created=now - timedelta(days=random.randint(0, 3650)),
+                    mime_type="application/pdf",
+                    checksum=uuid.uuid4().hex,
+                    filename=f"seed_{uuid.uuid4().hex}.pdf",
+                    # Roughly one in twenty rows sits in the trash.
+                    deleted_at=now if i % 20 == 0 else None,
+                )
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+
+        TagThrough = Document.tags.through
+        TagThrough.objects.bulk_create(
+            (
+                TagThrough(document_id=document.pk, tag_id=tag.pk)
+                for document in documents
+                for tag in random.sample(tags, 2)
+            ),
+            batch_size=5000,
+        )
+        Note.objects.bulk_create(
+            (
+                Note(document=document, note="Seeded note")
+                for document in documents[::4]
+            ),
+            batch_size=5000,
+        )
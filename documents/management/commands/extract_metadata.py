@@ -0,0 +1,69 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from documents.bulk_edit import batched_ids
+from documents.metadata import read_document_metadata, METADATA_FIELDS
+from documents.models import Document
+from documents.tasks import apply_metadata
+
+
+def document_metadata(document_id):
+    """
+    Return ``(document_id, metadata)``, with None for documents that have
+    no PDF or cannot be parsed. Runs in the worker processes.
+    """
+    try:
+        document = Document.objects.only(
+            "id", "filename", "archive_filename", "mime_type", "storage_type", "compression",
+        ).get(pk=document_id)
+        return document_id, read_document_metadata(document)
+    except Exception as e:
+        return document_id, e
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in page count and PDF metadata of documents processed before "
+        "metadata extraction existed. PDFs are parsed in a process pool and "
+        "every batch is saved with one bulk update."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+        parser.add_argument("--batch-size", type=int, default=200, help="Documents per bulk update.")
+        parser.add_argument("--all", action="store_true", help="Also re-read documents that have a page count.")
+
+    def handle(self, *args, **options):
+        queryset = Document.objects.all()
+        if not options["all"]:
+            queryset = queryset.filter(page_count__isnull=True)
+
+        updated = 0
+        failed = 0
+        # Spawned workers set up Django themselves instead of inheriting
+        # this process's database connections.
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as pool:
+            for batch in batched_ids(queryset, options["batch_size"]):
+                results = dict(pool.map(document_metadata, batch))
+                documents = list(Document.objects.filter(pk__in=batch).only("id", "created"))
+                changed = []
+                for document in documents:
+                    metadata = results.get(document.pk)
+                    if isinstance(metadata, Exception):
+                        self.stderr.write(f"Cannot read metadata of document {document.pk}: {metadata}")
+                        failed += 1
+                    elif metadata is not None:
+                        apply_metadata(document, metadata)
+                        changed.append(document)
+                # bulk_update() leaves the modified timestamp alone.
+                Document.objects.bulk_update(changed, [*METADATA_FIELDS, "created"])
+                updated += len(changed)
+
+        self.stdout.write(f"Updated {updated} documents, {failed} failed")
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q, Sum
+
+from documents.bulk_edit import batched_ids
+from documents.images import IMAGE_MIME_TYPES
+from documents.models import Document
+from documents.optimization import ARCHIVE_PROFILES
+from documents.priorities import PRIORITIES, BULK
+from documents.tasks import optimize_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue regeneration of every archive not yet built with the given "
+        "optimization profile. Archives are rebuilt from the originals, so "
+        "switching profiles never compounds lossy recompression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            choices=ARCHIVE_PROFILES,
+            help="Optimization profile (default: ARCHIVE_PROFILE, or IMAGE_ARCHIVE_PROFILE for images).",
+        )
+        parser.add_argument(
+            "--grown",
+            action="store_true",
+            help="Only archives that came out larger than their input PDF, or whose sizes are unknown.",
+        )
+        parser.add_argument("--limit", type=int, help="Queue at most this many documents.")
+        parser.add_argument(
+            "--priority",
+            choices=PRIORITIES,
+            default=BULK,
+            help="Queue the work is processed from (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        profile = options["profile"]
+        queryset = Document.objects.filter(archive_filename__isnull=False)
+        if profile:
+            queryset = queryset.exclude(archive_profile=profile)
+        else:
+            images = Q(mime_type__in=IMAGE_MIME_TYPES)
+            queryset = queryset.exclude(images, archive_profile=settings.IMAGE_ARCHIVE_PROFILE).exclude(
+                ~images, archive_profile=settings.ARCHIVE_PROFILE,
+            )
+        if options["grown"]:
+            queryset = queryset.exclude(archive_output_size__lte=F("archive_input_size"))
+        limit = options["limit"]
+
+        queued = 0
+        with optimize_archive.app.producer_or_acquire() as producer:
+            for batch in batched_ids(queryset):
+                if limit:
+                    batch = batch[:limit - queued]
+                for document_id in batch:
+                    optimize_archive.apply_async((document_id, profile), producer=producer, queue=options["priority"])
+                queued += len(batch)
+                if limit and queued >= limit:
+                    break
+
+        totals = Document.objects.filter(archive_input_size__isnull=False).aggregate(
+            input=Sum("archive_input_size"), output=Sum("archive_output_size"),
+        )
+        saved = (totals["input"] or 0) - (totals["output"] or 0)
+        self.stdout.write(f"Queued {queued} archives for the {profile or 'default'} profile")
+        self.stdout.write(f"Archive optimization has saved {saved} bytes so far")
@@ -0,0 +1,58 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.scrubber import referenced_thumbnails
+from documents.storage import get_storage, THUMBNAILS, QUARANTINE_PREFIX
+from documents.tasks import existing_document_ids
+from documents.thumbnails import thumbnail_pack, PACK_PREFIX
+from documents.previews import PREVIEW_PREFIX
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Move thumbnail files into the thumbnail pack, or with --compact drop "
+        "thumbnails of deleted documents and rewrite mostly dead segments. "
+        "Files are deleted once packed, so the command can be rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--compact", action="store_true", help="Compact the pack instead of packing files.")
+        parser.add_argument("--keep-files", action="store_true", help="Leave the thumbnail files in place.")
+
+    def handle(self, *args, **options):
+        if not settings.PACK_THUMBNAILS:
+            raise CommandError("PACK_THUMBNAILS is not enabled")
+        pack = thumbnail_pack()
+
+        if options["compact"]:
+            segments, reclaimed = pack.compact(existing=existing_document_ids)
+            self.stdout.write(f"Rewrote {segments} segments, reclaimed {reclaimed} bytes")
+            return
+
+        storage = get_storage(THUMBNAILS)
+        listing = (
+            name for name, _, _ in storage.listdir()
+            if not name.startswith((PACK_PREFIX, PREVIEW_PREFIX, QUARANTINE_PREFIX))
+        )
+        packed = 0
+        while batch := list(islice(listing, BATCH_SIZE)):
+            # Unreferenced files are left for collect_garbage.
+            for name in referenced_thumbnails(batch).intersection(batch):
+                document_id, extension = name.split(".", 1)
+                document_id = int(document_id)
+                # A single WebP left next to a bundle is stale.
+                stale = extension.startswith("webp") and storage.exists(name.replace(".webp", ".thumbs", 1))
+                # A packed entry is newer than any file left behind.
+                if pack.entry(document_id) is None and not stale:
+                    # Encrypted files are packed as they are.
+                    with storage.open(name) as f:
+                        pack.put(document_id, f.read())
+                    packed += 1
+                if not options["keep_files"]:
+                    storage.delete(name)
+
+        self.stdout.write(f"Packed {packed} thumbnails")
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documents.models import Document, Note
+from documents.trash import purge_trash, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Permanently delete documents and notes that have been in the trash "
+        "longer than the retention period, including their stored files. "
+        "Rows are deleted in small batches, each in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.TRASH_RETENTION_DAYS,
+            help="Retention period in days (default: TRASH_RETENTION_DAYS, %(default)s).",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Documents deleted per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options["days"])
+
+        if options["dry_run"]:
+            cutoff = timezone.now() - older_than
+            documents = Document.deleted_objects.filter(deleted_at__lt=cutoff).count()
+            notes = Note.deleted_objects.filter(deleted_at__lt=cutoff).count()
+            self.stdout.write(f"Would purge {documents} documents and {notes} notes")
+            return
+
+        documents, notes = purge_trash(older_than, options["batch_size"])
+        self.stdout.write(f"Purged {documents} documents and {notes} notes")
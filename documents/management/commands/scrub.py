@@ -0,0 +1,58 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from documents.scrubber import Scrubber, find_orphans, ORPHANED
+from documents.storage import AREAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify stored originals and archives against their checksums and "
+        "report missing, corrupt and orphaned files. Runs are incremental: "
+        "documents verified within --max-age days are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Files hashed in parallel.")
+        parser.add_argument(
+            "--bandwidth",
+            type=float,
+            default=None,
+            help="Cap the combined read rate in MB/s (default: unlimited).",
+        )
+        parser.add_argument("--max-age", type=int, default=30, help="Re-verify documents after this many days.")
+        parser.add_argument("--limit", type=int, help="Verify at most this many documents.")
+        parser.add_argument("--orphans", action="store_true", help="Also list files no document refers to.")
+        parser.add_argument("--report", help="Write every problem to this file as JSON lines.")
+
+    def handle(self, *args, **options):
+        scrubber = Scrubber(
+            workers=options["workers"],
+            bandwidth=options["bandwidth"] * 1_000_000 if options["bandwidth"] else None,
+            max_age=timedelta(days=options["max_age"]),
+            limit=options["limit"],
+        )
+        stats, problems = scrubber.run()
+        report = [
+            {"document": document_id, "file": file, "problem": problem}
+            for document_id, file, problem in problems
+        ]
+
+        if options["orphans"]:
+            stats[ORPHANED] = 0
+            for area in AREAS:
+                for name, size, _ in find_orphans(area):
+                    report.append({"area": area, "name": name, "size": size, "problem": ORPHANED})
+                    stats[ORPHANED] += 1
+
+        if options["report"]:
+            with open(options["report"], "w") as f:
+                for entry in report:
+                    f.write(json.dumps(entry) + "\n")
+        else:
+            for entry in report:
+                self.stdout.write(json.dumps(entry))
+
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in stats.items()))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import compression
+from documents.models import Document
+from documents.serializers import PostDocumentSerializer
+from documents.storage import get_storage, ORIGINALS
+
+# zstd needs a reasonable number of samples to find shared content.
+MIN_SAMPLES = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a zstd dictionary on small office originals and store it next "
+        "to the originals. Set ZSTD_DICTIONARY_ID to the printed id to "
+        "compress new small files with it; files compressed with older "
+        "dictionaries stay readable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=2000, help="Maximum number of files to train on.")
+        parser.add_argument("--size", type=int, default=112640, help="Dictionary size in bytes.")
+
+    def handle(self, *args, **options):
+        compression.require_zstandard()
+        office_mime_types = [
+            mime_type for mime_type in PostDocumentSerializer.SUPPORTED_MIME_TYPES
+            if mime_type != "application/pdf" and not mime_type.startswith("image/")
+        ]
+        documents = Document.objects.filter(
+            compression=Document.COMPRESSION_NONE,
+            storage_type=Document.STORAGE_TYPE_UNENCRYPTED,
+            mime_type__in=office_mime_types,
+        ).order_by("-added").only("filename", "storage_type", "compression")
+
+        storage = get_storage(ORIGINALS)
+        samples = []
+        for document in documents.iterator():
+            try:
+                if storage.size(document.source_name) > compression.DICTIONARY_MAX_FILE_SIZE:
+                    continue
+                with storage.open(document.source_name) as f:
+                    samples.append(f.read())
+            except FileNotFoundError:
+                continue
+            if len(samples) >= options["samples"]:
+                break
+
+        if len(samples) < MIN_SAMPLES:
+            raise CommandError(f"Found {len(samples)} small office files, need at least {MIN_SAMPLES}")
+
+        dictionary = compression.zstandard.train_dictionary(options["size"], samples)
+        dict_id = dictionary.dict_id()
+        storage.save(compression.dictionary_name(dict_id), dictionary.as_bytes())
+        self.stdout.write(
+            f"Trained dictionary {dict_id} on {len(samples)} files. "
+            f"Set ZSTD_DICTIONARY_ID={dict_id} to use it."
+        )
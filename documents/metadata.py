@@ -0,0 +1,62 @@
+import logging
+
+from django.utils import timezone
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+# Document fields filled in from the PDF
+METADATA_FIELDS = ["page_count", "pdf_producer", "pdf_author", "pdf_created", "page_width", "page_height"]
+
+
+def read_pdf_metadata(path):
+    """
+    Return the page count, producer, author, embedded creation date and
+    first page size (in points, rotation applied) of the PDF at ``path``.
+
+    Only the cross-reference table, the document information dictionary
+    and the page tree are parsed; no page content is decoded or rendered.
+    """
+    reader = PdfReader(path)
+    info = reader.metadata or {}
+    metadata = {
+        "page_count": len(reader.pages),
+        "pdf_producer": str(info.get("/Producer") or "")[:255],
+        "pdf_author": str(info.get("/Author") or "")[:255],
+        "pdf_created": None,
+        "page_width": None,
+        "page_height": None,
+    }
+
+    try:
+        created = info.creation_date if info else None
+    except ValueError:
+        # Malformed dates are common in the wild.
+        created = None
+    if created is not None and timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    metadata["pdf_created"] = created
+
+    if metadata["page_count"]:
+        page = reader.pages[0]
+        width, height = round(float(page.mediabox.width)), round(float(page.mediabox.height))
+        if page.rotation % 180:
+            width, height = height, width
+        metadata["page_width"], metadata["page_height"] = width, height
+
+    return metadata
+
+
+def read_document_metadata(document):
+    """
+    Read the metadata of ``document`` from its archive, or from the
+    original for PDFs without an archive. Returns None when there is no
+    PDF to read.
+    """
+    if document.has_archive_version:
+        with document.archive_local_path() as path:
+            return read_pdf_metadata(path)
+    if document.mime_type == "application/pdf":
+        with document.source_local_path() as path:
+            return read_pdf_metadata(path)
+    return None
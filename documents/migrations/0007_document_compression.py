@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_live_row_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='compression',
+            field=models.CharField(choices=[('none', 'Uncompressed'), ('zstd', 'Compressed with Zstandard')], default='none', editable=False, help_text='How the original is compressed in storage', max_length=4, verbose_name='compression'),
+        ),
+    ]
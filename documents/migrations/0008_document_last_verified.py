@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='last_verified',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='When the scrubber last confirmed the stored files match their checksums', null=True, verbose_name='last verified'),
+        ),
+    ]
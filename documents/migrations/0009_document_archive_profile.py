@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_document_last_verified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='archive_input_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Size in bytes of the PDF before archive optimization', null=True, verbose_name='archive input size'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='archive_output_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Size in bytes of the optimized archive', null=True, verbose_name='archive output size'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='archive_profile',
+            field=models.CharField(blank=True, editable=False, help_text='The optimization profile the archive was generated with', max_length=16, verbose_name='archive profile'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_archive_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='page_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Height of the first page in PDF points', null=True, verbose_name='page height'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='page_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Width of the first page in PDF points', null=True, verbose_name='page width'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pdf_author',
+            field=models.CharField(blank=True, editable=False, help_text='The author recorded in the PDF', max_length=255, verbose_name='PDF author'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pdf_created',
+            field=models.DateTimeField(blank=True, editable=False, help_text='The creation date recorded in the PDF', null=True, verbose_name='PDF created'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pdf_producer',
+            field=models.CharField(blank=True, editable=False, help_text='The software that produced the PDF', max_length=255, verbose_name='PDF producer'),
+        ),
+    ]
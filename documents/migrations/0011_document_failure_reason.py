@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_document_pdf_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='failure_message',
+            field=models.TextField(blank=True, editable=False, help_text='The failed step and the tail of the tool output', verbose_name='failure message'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='failure_reason',
+            field=models.CharField(blank=True, choices=[('timeout', 'Timed out'), ('cpu', 'CPU time limit exceeded'), ('memory', 'Out of memory'), ('crash', 'Crashed'), ('exit', 'Exited with an error'), ('missing', 'Tool not installed'), ('error', 'Other error')], editable=False, help_text='Why processing last failed, empty once it succeeds', max_length=16, verbose_name='failure reason'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_processing_status(apps, schema_editor):
+    # Documents processed before the status existed: those without an
+    # archive are put in the failed set so they can be re-driven.
+    Document = apps.get_model('documents', 'Document')
+    documents = Document._base_manager.all()
+    documents.filter(archive_filename__isnull=False).update(processing_status='done', processing_updated=None)
+    documents.filter(archive_filename__isnull=True).update(processing_status='failed', processing_updated=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_document_failure_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Processing runs since the document was queued or re-driven', verbose_name='processing attempts'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='processing_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('retrying', 'Waiting for a retry'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', editable=False, help_text='Where the document is in archive and thumbnail generation', max_length=10, verbose_name='processing status'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='processing_updated',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, help_text='When the processing status last changed', null=True, verbose_name='processing updated'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='failure_reason',
+            field=models.CharField(blank=True, choices=[('timeout', 'Timed out'), ('cpu', 'CPU time limit exceeded'), ('memory', 'Out of memory'), ('crash', 'Crashed'), ('exit', 'Exited with an error'), ('missing', 'Tool not installed'), ('unavailable', 'Storage or database unavailable'), ('error', 'Other error')], editable=False, help_text='Why processing last failed, empty once it succeeds', max_length=16, verbose_name='failure reason'),
+        ),
+        migrations.RunPython(set_processing_status, migrations.RunPython.noop),
+    ]
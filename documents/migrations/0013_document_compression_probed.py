@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_document_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='compression_probed',
+            field=models.BooleanField(default=False, editable=False, help_text='The original was found not to compress well and is kept as it is', verbose_name='compression probed'),
+        ),
+    ]
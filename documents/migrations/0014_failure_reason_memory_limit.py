@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_document_compression_probed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='failure_reason',
+            field=models.CharField(blank=True, choices=[('timeout', 'Timed out'), ('cpu', 'CPU time limit exceeded'), ('memory', 'Killed by the OOM killer'), ('memory_limit', 'Memory limit exceeded'), ('crash', 'Crashed'), ('exit', 'Exited with an error'), ('missing', 'Tool not installed'), ('unavailable', 'Storage or database unavailable'), ('error', 'Other error')], editable=False, help_text='Why processing last failed, empty once it succeeds', max_length=16, verbose_name='failure reason'),
+        ),
+    ]
@@ -1,5 +1,4 @@
 import datetime
-from pathlib import Path
 from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -8,6 +7,16 @@ from django.core.validators import MinValueValidator
 from django.contrib.auth import get_user_model
 from django_softdelete.models import SoftDeleteModel
 import base64
+from contextlib import contextmanager
+from documents.storage import get_storage, local_copy, ORIGINALS, ARCHIVE, THUMBNAILS
+from documents.crypto import (
+    decrypt_bytes, encrypt_bytes, is_encrypted_data, open_encrypted, plaintext_size, save_encrypted, ENCRYPTED_SUFFIX,
+)
+from documents.thumbnails import (
+    choose_thumbnail, thumbnail_pack, unbundle_thumbnails, DEFAULT_THUMBNAIL_WIDTH, THUMBNAIL_FORMATS,
+)
+from documents.compression import content_size, open_decompressed, ZSTD_SUFFIX
+from documents.watchdog import FAILURE_REASONS
 if settings.AUDIT_LOG_ENABLED:
     from auditlog.registry import auditlog
 
@@ -99,6 +108,24 @@ class Document(SoftDeleteModel):
         (STORAGE_TYPE_UNENCRYPTED, "Unencrypted"),
         (STORAGE_TYPE_GPG, "Encrypted with GNU Privacy Guard"),
     )
+    COMPRESSION_NONE = "none"
+    COMPRESSION_ZSTD = "zstd"
+    COMPRESSION_TYPES = (
+        (COMPRESSION_NONE, "Uncompressed"),
+        (COMPRESSION_ZSTD, "Compressed with Zstandard"),
+    )
+    PROCESSING_QUEUED = "queued"
+    PROCESSING_RUNNING = "processing"
+    PROCESSING_RETRYING = "retrying"
+    PROCESSING_DONE = "done"
+    PROCESSING_FAILED = "failed"
+    PROCESSING_STATUSES = (
+        (PROCESSING_QUEUED, "Queued"),
+        (PROCESSING_RUNNING, "Processing"),
+        (PROCESSING_RETRYING, "Waiting for a retry"),
+        (PROCESSING_DONE, "Done"),
+        (PROCESSING_FAILED, "Failed"),
+    )
 
     project = models.ForeignKey(
         Project,
@@ -159,6 +186,46 @@ class Document(SoftDeleteModel):
         ),
     )
 
+    page_width = models.PositiveIntegerField(
+        _("page width"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Width of the first page in PDF points"),
+    )
+
+    page_height = models.PositiveIntegerField(
+        _("page height"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Height of the first page in PDF points"),
+    )
+
+    pdf_producer = models.CharField(
+        _("PDF producer"),
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text=_("The software that produced the PDF"),
+    )
+
+    pdf_author = models.CharField(
+        _("PDF author"),
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text=_("The author recorded in the PDF"),
+    )
+
+    pdf_created = models.DateTimeField(
+        _("PDF created"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("The creation date recorded in the PDF"),
+    )
+
     checksum = models.CharField(
         _("checksum"),
         max_length=32,
@@ -199,6 +266,97 @@ class Document(SoftDeleteModel):
         editable=False,
     )
 
+    archive_profile = models.CharField(
+        _("archive profile"),
+        max_length=16,
+        blank=True,
+        editable=False,
+        help_text=_("The optimization profile the archive was generated with"),
+    )
+
+    archive_input_size = models.PositiveBigIntegerField(
+        _("archive input size"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Size in bytes of the PDF before archive optimization"),
+    )
+
+    archive_output_size = models.PositiveBigIntegerField(
+        _("archive output size"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Size in bytes of the optimized archive"),
+    )
+
+    processing_status = models.CharField(
+        _("processing status"),
+        max_length=10,
+        choices=PROCESSING_STATUSES,
+        default=PROCESSING_QUEUED,
+        editable=False,
+        db_index=True,
+        help_text=_("Where the document is in archive and thumbnail generation"),
+    )
+
+    processing_attempts = models.PositiveSmallIntegerField(
+        _("processing attempts"),
+        default=0,
+        editable=False,
+        help_text=_("Processing runs since the document was queued or re-driven"),
+    )
+
+    processing_updated = models.DateTimeField(
+        _("processing updated"),
+        default=timezone.now,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("When the processing status last changed"),
+    )
+
+    failure_reason = models.CharField(
+        _("failure reason"),
+        max_length=16,
+        choices=FAILURE_REASONS,
+        blank=True,
+        editable=False,
+        help_text=_("Why processing last failed, empty once it succeeds"),
+    )
+
+    failure_message = models.TextField(
+        _("failure message"),
+        blank=True,
+        editable=False,
+        help_text=_("The failed step and the tail of the tool output"),
+    )
+
+    last_verified = models.DateTimeField(
+        _("last verified"),
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text=_("When the scrubber last confirmed the stored files match their checksums"),
+    )
+
+    compression = models.CharField(
+        _("compression"),
+        max_length=4,
+        choices=COMPRESSION_TYPES,
+        default=COMPRESSION_NONE,
+        editable=False,
+        help_text=_("How the original is compressed in storage"),
+    )
+
+    compression_probed = models.BooleanField(
+        _("compression probed"),
+        default=False,
+        editable=False,
+        help_text=_("The original was found not to compress well and is kept as it is"),
+    )
+
     added = models.DateTimeField(
         _("added"),
         default=timezone.now,
@@ -240,6 +398,30 @@ class Document(SoftDeleteModel):
         ordering = ("-created",)
         verbose_name = _("document")
         verbose_name_plural = _("documents")
+        # Every query goes through SoftDeleteManager (deleted_at IS NULL) and
+        # is ordered by created, so the indexes only cover live rows.
+        indexes = [
+            models.Index(
+                fields=["created"],
+                name="document_live_created_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+            models.Index(
+                fields=["project", "created"],
+                name="document_project_created_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+            models.Index(
+                fields=["document_type", "created"],
+                name="document_doctype_created_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+            models.Index(
+                fields=["correspondent", "created"],
+                name="document_corresp_created_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
 
     def __str__(self) -> str:
 
@@ -258,48 +440,182 @@ class Document(SoftDeleteModel):
         return self.archive_filename is not None 
     
     @property
-    def archive_path(self) -> Path | None:
+    def is_encrypted(self) -> bool:
+        return self.storage_type == self.STORAGE_TYPE_GPG
+
+    def open_stored(self, area, name):
+        """
+        Open a stored file of this document, decrypting it on the fly if
+        the document is encrypted.
+        """
+        storage = get_storage(area)
+        if self.is_encrypted:
+            return open_encrypted(storage, name)
+        return storage.open(name)
+
+    def stored_size(self, area, name) -> int:
+        size = get_storage(area).size(name)
+        if self.is_encrypted:
+            return plaintext_size(size)
+        return size
+
+    def save_stored(self, area, name, content):
+        """
+        Store ``content`` (bytes or a binary file object) as ``name``,
+        encrypted if the document is encrypted.
+        """
+        if self.is_encrypted:
+            save_encrypted(get_storage(area), name, content)
+        else:
+            get_storage(area).save(name, content)
+
+    @property
+    def archive_name(self) -> str | None:
         if self.has_archive_version:
-            return  (settings.ARCHIVE_DIR/ Path(str(self.archive_filename))).resolve()
+            fname = str(self.archive_filename)
+            if self.is_encrypted:
+                fname += ENCRYPTED_SUFFIX
+            return fname
         else:
             return None
-       
+
+    @property
+    def archive_savings(self) -> int | None:
+        """
+        Bytes saved by optimizing the archive, negative if it grew.
+        """
+        if self.archive_input_size is None or self.archive_output_size is None:
+            return None
+        return self.archive_input_size - self.archive_output_size
+
     @property
     def archive_file(self):
-        if self.archive_path:
-            return Path(self.archive_path).open("rb")
+        if self.has_archive_version:
+            return self.open_stored(ARCHIVE, self.archive_name)
         else:
             return None
 
     @property
-    def source_path(self) -> Path:
+    def archive_size(self) -> int:
+        return self.stored_size(ARCHIVE, self.archive_name)
+
+    @contextmanager
+    def archive_local_path(self):
+        """
+        Yield a local path to the plain archive PDF.
+        """
+        if self.is_encrypted:
+            with local_copy(self.archive_file, str(self.archive_filename)) as path:
+                yield path
+        else:
+            with get_storage(ARCHIVE).local_path(self.archive_name) as path:
+                yield path
+
+    @property
+    def source_name(self) -> str:
         fname = str(self.filename)
-        if self.storage_type == self.STORAGE_TYPE_GPG:
-            fname += ".gpg"
-        
-        return (settings.ORIGINAL_DIR / Path(fname)).resolve()
+        if self.compression == self.COMPRESSION_ZSTD:
+            fname += ZSTD_SUFFIX
+        if self.is_encrypted:
+            fname += ENCRYPTED_SUFFIX
+
+        return fname
     
     @property
     def source_file(self): 
-        return Path(self.source_path).open("rb")
+        source_file = self.open_stored(ORIGINALS, self.source_name)
+        if self.compression == self.COMPRESSION_ZSTD:
+            return open_decompressed(source_file)
+        return source_file
+
+    @property
+    def source_size(self) -> int:
+        if self.compression == self.COMPRESSION_ZSTD:
+            return content_size(self.open_stored(ORIGINALS, self.source_name))
+        return self.stored_size(ORIGINALS, self.source_name)
+
+    @contextmanager
+    def source_local_path(self):
+        """
+        Yield a local path to the plain original, for tools that need one.
+        """
+        if self.is_encrypted or self.compression != self.COMPRESSION_NONE:
+            with local_copy(self.source_file, str(self.filename)) as path:
+                yield path
+        else:
+            with get_storage(ORIGINALS).local_path(self.source_name) as path:
+                yield path
     
     @property
-    def thumbnail_path(self) -> Path:
-        webp_file_name = f"{self.pk:07}.webp"
-        if self.storage_type == self.STORAGE_TYPE_GPG:
-            webp_file_name += ".gpg"
+    def thumbnail_name(self) -> str:
+        file_name = f"{self.pk:07}.thumbs"
+        if self.is_encrypted:
+            file_name += ENCRYPTED_SUFFIX
+
+        return file_name
 
-        webp_file_path = settings.THUMBNAIL_DIR / Path(webp_file_name)
+    @property
+    def legacy_thumbnail_name(self) -> str:
+        """
+        Name of the single WebP thumbnail written before thumbnail bundles.
+        """
+        webp_file_name = f"{self.pk:07}.webp"
+        if self.is_encrypted:
+            webp_file_name += ENCRYPTED_SUFFIX
 
-        return webp_file_path.resolve()
+        return webp_file_name
     
+    def save_thumbnail(self, data):
+        """
+        Store a thumbnail bundle (see documents.thumbnails).
+        """
+        if settings.PACK_THUMBNAILS:
+            thumbnail_pack().put(self.pk, encrypt_bytes(data) if self.is_encrypted else data)
+        else:
+            self.save_stored(THUMBNAILS, self.thumbnail_name, data)
+            get_storage(THUMBNAILS).delete(self.legacy_thumbnail_name)
+
+    @property
+    def thumbnail(self) -> bytes | None:
+        """
+        The stored thumbnail bundle, from the thumbnail pack or, for
+        thumbnails not packed yet, its own file.
+        """
+        if settings.PACK_THUMBNAILS:
+            data = thumbnail_pack().get(self.pk)
+            if data is not None:
+                # Packed entries are encrypted when their document was at
+                # the time they were written, so check the data itself.
+                return decrypt_bytes(data) if is_encrypted_data(data) else data
+        for name in (self.thumbnail_name, self.legacy_thumbnail_name):
+            try:
+                with self.open_stored(THUMBNAILS, name) as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        return None
+
+    def thumbnail_variant(self, width=DEFAULT_THUMBNAIL_WIDTH, accept="image/webp"):
+        """
+        Return ``(mime_type, data)`` of the thumbnail variant best matching
+        ``width`` and the ``accept`` header, or None.
+        """
+        data = self.thumbnail
+        if data is None:
+            return None
+        variants = unbundle_thumbnails(data)
+        chosen = choose_thumbnail(variants, width, accept)
+        if chosen is None:
+            return None
+        return THUMBNAIL_FORMATS[chosen[0]], variants[chosen]
+
     @property
     def thumbnail_str(self):
-        file_path = Path(self.thumbnail_path)
-        if file_path.exists():
-            return base64.b64encode(file_path.open("rb").read()).decode('utf-8')
-        else:
+        variant = self.thumbnail_variant()
+        if variant is None:
             return None
+        data = variant[1]
+        return base64.b64encode(data).decode('utf-8')
     
     @property
     def created_date(self):
@@ -339,6 +655,13 @@ class Note(SoftDeleteModel):
         ordering = ("created",)
         verbose_name = _("note")
         verbose_name_plural = _("notes")
+        indexes = [
+            models.Index(
+                fields=["document", "created"],
+                name="note_document_created_idx",
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return self.note
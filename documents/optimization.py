@@ -0,0 +1,82 @@
+from django.core.exceptions import ImproperlyConfigured
+
+LOSSLESS = "lossless"
+BALANCED = "balanced"
+COMPACT = "compact"
+
+# Applied by every profile: subset and compress embedded fonts, compress
+# page streams and store identical images once.
+COMMON_ARGS = [
+    '-dEmbedAllFonts=true',
+    '-dSubsetFonts=true',
+    '-dCompressFonts=true',
+    '-dCompressPages=true',
+    '-dDetectDuplicateImages=true',
+]
+
+# Pack objects into compressed object streams (PDF 1.5+, allowed by PDF/A-2;
+# older GhostScript versions ignore the switches).
+OBJECT_STREAM_ARGS = ['-dWriteObjStms=true', '-dWriteXRefStm=true']
+
+
+def downsample_args(color_dpi, mono_dpi):
+    return [
+        '-dDownsampleColorImages=true', f'-dColorImageResolution={color_dpi}',
+        '-dDownsampleGrayImages=true', f'-dGrayImageResolution={color_dpi}',
+        '-dDownsampleMonoImages=true', f'-dMonoImageResolution={mono_dpi}',
+        '-dColorImageDownsampleType=/Bicubic', '-dGrayImageDownsampleType=/Bicubic',
+        '-dColorImageDownsampleThreshold=1.5', '-dGrayImageDownsampleThreshold=1.5',
+    ]
+
+
+def jpeg_quality_params(qfactor):
+    """
+    PostScript setting the JPEG quality of recompressed images; pdfwrite
+    has no command line switch for it. Lower QFactors keep more detail.
+    """
+    image_dict = f"<< /QFactor {qfactor} /Blend 1 /HSamples [2 1 1 2] /VSamples [2 1 1 2] >>"
+    return (
+        f"<< /ColorACSImageDict {image_dict} /GrayACSImageDict {image_dict} "
+        f"/ColorImageDict {image_dict} /GrayImageDict {image_dict} >> setdistillerparams"
+    )
+
+
+# profile: (GhostScript switches, PostScript run before the input or None)
+ARCHIVE_PROFILES = {
+    # Never re-encode or downsample images, only restructure the file.
+    LOSSLESS: ([
+        *COMMON_ARGS,
+        '-dPassThroughJPEGImages=true', '-dPassThroughJPXImages=true',
+        '-dDownsampleColorImages=false', '-dDownsampleGrayImages=false', '-dDownsampleMonoImages=false',
+        '-dAutoFilterColorImages=false', '-dAutoFilterGrayImages=false',
+        '-dColorImageFilter=/FlateEncode', '-dGrayImageFilter=/FlateEncode',
+    ], None),
+    # Scans at up to 200 dpi stay legible on screen and in print.
+    BALANCED: ([
+        *COMMON_ARGS, *OBJECT_STREAM_ARGS,
+        '-dPassThroughJPEGImages=false',
+        *downsample_args(200, 300),
+    ], jpeg_quality_params(0.4)),
+    # Screen reading only.
+    COMPACT: ([
+        *COMMON_ARGS, *OBJECT_STREAM_ARGS,
+        '-dPassThroughJPEGImages=false',
+        *downsample_args(150, 300),
+    ], jpeg_quality_params(0.76)),
+}
+
+
+def ghostscript_args(profile, input_path):
+    """
+    Return the GhostScript arguments applying ``profile`` to
+    ``input_path``; they go after the output options.
+    """
+    try:
+        switches, postscript = ARCHIVE_PROFILES[profile]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown archive profile {profile!r}, expected one of {', '.join(ARCHIVE_PROFILES)}"
+        )
+    if postscript:
+        return [*switches, '-c', postscript, '-f', str(input_path)]
+    return [*switches, str(input_path)]
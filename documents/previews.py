@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import time
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+
+from documents.storage import default_file_mode
+
+# Rendered pages are cached under THUMBNAIL_DIR/previews as
+# "<document id>/<page>-<width>.webp". A hit bumps the file's mtime, so
+# evicting the oldest mtimes first makes the cache least recently used.
+PREVIEW_PREFIX = "previews/"
+PREVIEW_WIDTHS = (320, 640, 960, 1280, 1920)
+PREFETCH_PAGES = 3
+PENDING_SUFFIX = ".pending"
+# A render that has not finished after this long is assumed lost.
+PENDING_TIMEOUT = 120
+EVICT_INTERVAL = 30
+LOW_WATERMARK = 0.9
+
+
+def preview_width(width):
+    """
+    Round ``width`` up to the nearest cached width, so arbitrary client
+    widths cannot fill the cache with near duplicates.
+    """
+    for candidate in PREVIEW_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return PREVIEW_WIDTHS[-1]
+
+
+class PreviewCache:
+
+    def __init__(self, root, max_size):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.last_evicted = 0
+
+    def path(self, document_id, page, width):
+        return self.root / str(document_id) / f"{page:05}-{width}.webp"
+
+    def get(self, document_id, page, width):
+        path = self.path(document_id, page, width)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, document_id, page, width, data):
+        path = self.path(document_id, page, width)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, default_file_mode())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def claim(self, document_id, page, width):
+        """
+        Mark a page as being rendered. Returns False when it is cached or
+        another render of it is already pending.
+        """
+        path = self.path(document_id, page, width)
+        if path.exists():
+            return False
+        pending = path.with_suffix(PENDING_SUFFIX)
+        pending.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.close(os.open(pending, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        try:
+            if time.time() - pending.stat().st_mtime < PENDING_TIMEOUT:
+                return False
+        except FileNotFoundError:
+            pass
+        pending.touch()
+        return True
+
+    def release(self, document_id, page, width):
+        self.path(document_id, page, width).with_suffix(PENDING_SUFFIX).unlink(missing_ok=True)
+
+    def pending(self, document_id, page, width):
+        return self.path(document_id, page, width).with_suffix(PENDING_SUFFIX).exists()
+
+    def wait(self, document_id, page, width, timeout):
+        """
+        Wait up to ``timeout`` seconds for a pending render and return the
+        preview, or None if it did not appear.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            data = self.get(document_id, page, width)
+            if data is not None or not self.pending(document_id, page, width):
+                # Either rendered, or the render finished without this page.
+                return data or self.get(document_id, page, width)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+    def delete(self, document_id):
+        shutil.rmtree(self.root / str(document_id), ignore_errors=True)
+
+    def evict(self, force=False):
+        """
+        Delete the least recently used previews until the cache is below
+        LOW_WATERMARK of ``max_size``. Runs at most every EVICT_INTERVAL
+        seconds per process unless forced. Returns the bytes freed.
+        """
+        if not force and time.monotonic() - self.last_evicted < EVICT_INTERVAL:
+            return 0
+        self.last_evicted = time.monotonic()
+
+        files = []
+        total = 0
+        for directory in os.scandir(self.root) if self.root.exists() else ():
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(".webp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return 0
+
+        freed = 0
+        files.sort()
+        for _, size, path in files:
+            if total - freed <= self.max_size * LOW_WATERMARK:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            freed += size
+        return freed
+
+
+@cache
+def get_preview_cache(root, max_size):
+    return PreviewCache(root, max_size)
+
+
+def preview_cache():
+    return get_preview_cache(Path(settings.THUMBNAIL_DIR) / PREVIEW_PREFIX, settings.PREVIEW_CACHE_SIZE)
+
@@ -0,0 +1,7 @@
+# Priority classes of queued work, each consumed from the Celery queue of
+# the same name. Interactive work (uploads from the UI) has workers of its
+# own, bulk work (imports, backfills, maintenance) runs on the capacity
+# left over.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
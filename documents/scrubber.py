@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from documents.bulk_edit import batched_ids
+from documents.compression import DICTIONARY_PREFIX
+from documents.models import Document
+from documents.storage import get_storage, ORIGINALS, ARCHIVE, THUMBNAILS, QUARANTINE_PREFIX
+from documents.thumbnails import PACK_PREFIX
+from documents.previews import PREVIEW_PREFIX
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+BATCH_SIZE = 500
+
+MISSING = "missing"
+CORRUPT = "corrupt"
+ORPHANED = "orphaned"
+
+
+class TokenBucket:
+    """
+    Limit the combined read rate of all scrubber threads to ``rate`` bytes
+    per second, allowing bursts of up to one second's worth.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def hash_stream(f, bucket=None):
+    md5 = hashlib.md5()
+    while chunk := f.read(READ_SIZE):
+        md5.update(chunk)
+        if bucket:
+            bucket.consume(len(chunk))
+    return md5.hexdigest()
+
+
+def verify_document(document, bucket=None):
+    """
+    Stream-hash the original and archive of ``document`` and return a list
+    of ``(file, problem)`` pairs, empty when both match their checksums.
+    """
+    files = [("original", lambda: document.source_file, document.checksum)]
+    if document.has_archive_version:
+        files.append(("archive", lambda: document.archive_file, document.archive_checksum))
+
+    problems = []
+    for file, opener, checksum in files:
+        try:
+            with opener() as f:
+                if hash_stream(f, bucket) != checksum:
+                    problems.append((file, CORRUPT))
+        except FileNotFoundError:
+            problems.append((file, MISSING))
+        except Exception as e:
+            logger.error(f"Cannot verify the {file} of document {document.pk}: {e}")
+            problems.append((file, CORRUPT))
+    return problems
+
+
+class Scrubber:
+    """
+    Check that every document's original and archive still match their
+    checksums.
+
+    Files are hashed in a thread pool with the combined read rate capped
+    by ``bandwidth`` (bytes per second), so a full pass can run alongside
+    the API. Documents that pass get ``last_verified`` set and are skipped
+    until they are older than ``max_age``; failing documents are rechecked
+    on the next run.
+    """
+
+    def __init__(self, workers=2, bandwidth=None, max_age=timedelta(days=30), limit=None):
+        self.workers = workers
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.max_age = max_age
+        self.limit = limit
+
+    def queryset(self):
+        cutoff = timezone.now() - self.max_age
+        return Document.objects.filter(
+            Q(last_verified__isnull=True) | Q(last_verified__lt=cutoff)
+        )
+
+    def run(self):
+        """
+        Verify every due document and return ``(stats, problems)``, where
+        ``problems`` lists ``(document_id, file, problem)``.
+        """
+        self.stats = {"verified": 0, MISSING: 0, CORRUPT: 0}
+        problems = []
+        checked = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batched_ids(self.queryset(), BATCH_SIZE):
+                if self.limit:
+                    batch = batch[:self.limit - checked]
+                documents = list(Document.objects.filter(pk__in=batch).only(
+                    "id", "filename", "archive_filename", "checksum", "archive_checksum",
+                    "storage_type", "compression",
+                ))
+                verified = []
+                for document, document_problems in zip(
+                    documents, pool.map(lambda d: verify_document(d, self.bucket), documents)
+                ):
+                    if not document_problems:
+                        verified.append(document.pk)
+                    for file, problem in document_problems:
+                        logger.warning(f"Document {document.pk}: {file} is {problem}")
+                        problems.append((document.pk, file, problem))
+                        self.stats[problem] += 1
+
+                # update() leaves the modified timestamp alone.
+                Document.objects.filter(pk__in=verified).update(last_verified=timezone.now())
+                self.stats["verified"] += len(verified)
+                checked += len(batch)
+                if self.limit and checked >= self.limit:
+                    break
+
+        return self.stats, problems
+
+
+def referenced_originals(names):
+    # Stored names carry ".zst" and ".gpg" suffixes, so look up every
+    # candidate base filename and compare the names the rows expect.
+    candidates = set()
+    for name in names:
+        for suffix in ("", ".gpg"):
+            base = name.removesuffix(suffix)
+            candidates.update((base, base.removesuffix(".zst")))
+    documents = Document.global_objects.filter(filename__in=candidates).only(
+        "id", "filename", "storage_type", "compression"
+    )
+    return {document.source_name for document in documents}
+
+
+def referenced_archives(names):
+    candidates = {name.removesuffix(".gpg") for name in names}
+    documents = Document.global_objects.filter(archive_filename__in=candidates).only(
+        "id", "archive_filename", "storage_type"
+    )
+    return {document.archive_name for document in documents}
+
+
+def referenced_thumbnails(names):
+    ids = {int(name.split(".")[0]) for name in names if name.split(".")[0].isdigit()}
+    documents = Document.global_objects.filter(pk__in=ids).only("id", "storage_type")
+    return {
+        name for document in documents
+        for name in (document.thumbnail_name, document.legacy_thumbnail_name)
+    }
+
+
+REFERENCED = {
+    ORIGINALS: referenced_originals,
+    ARCHIVE: referenced_archives,
+    THUMBNAILS: referenced_thumbnails,
+}
+
+
+def find_orphans(area, batch_size=1000):
+    """
+    Yield ``(name, size, modified)`` for every file in the ``area`` storage
+    that no document (including soft-deleted ones) refers to. The listing
+    is streamed and checked against the database one batch at a time.
+    Quarantined files, compression dictionaries, thumbnail packs and
+    cached previews are not reported.
+    """
+    reserved = {
+        ORIGINALS: (QUARANTINE_PREFIX, DICTIONARY_PREFIX),
+        ARCHIVE: (QUARANTINE_PREFIX,),
+        THUMBNAILS: (QUARANTINE_PREFIX, PACK_PREFIX, PREVIEW_PREFIX),
+    }[area]
+    listing = (entry for entry in get_storage(area).listdir() if not entry[0].startswith(reserved))
+    while batch := list(islice(listing, batch_size)):
+        referenced = REFERENCED[area]([name for name, _, _ in batch])
+        for entry in batch:
+            if entry[0] not in referenced:
+                yield entry
@@ -1,4 +1,6 @@
+from collections import defaultdict
 from django.utils import timezone
+from django.utils.encoding import force_str
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
@@ -13,12 +15,41 @@ from documents.models import (
 )
 
 from documents.validators import hex_color_validator
+from documents.watchdog import FAILURE_REASONS
+from documents.priorities import PRIORITIES, INTERACTIVE, BULK
 
 import magic
 import hashlib
 
 User = get_user_model()
 
+
+class DynamicFieldsMixin:
+    """
+    Narrow the rendered fields to the ``fields`` and ``expand`` sets passed in
+    the serializer context.
+
+    ``Meta.expandable_fields`` are the expensive fields (nested relations, file
+    reads). They are rendered by default, but once ``expand`` is given only the
+    listed ones are kept. ``Meta.field_sources`` maps fields that are not backed
+    by a model field of the same name to the model fields they read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get("fields")
+        expand = self.context.get("expand")
+        expandable = getattr(self.Meta, "expandable_fields", [])
+
+        for field_name in list(self.fields):
+            if expand is not None and field_name in expandable:
+                keep = field_name in expand
+            else:
+                keep = fields is None or field_name in fields
+            if not keep:
+                self.fields.pop(field_name)
+
+
 class DocumentTypeSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -34,6 +65,9 @@ class ProjectSerializer(serializers.ModelSerializer):
         model = Project
         fields = ["id", "title", "description", "status", "status_display", "start_date"]
         read_only_fileds = ["id"]
+        field_sources = {
+            "status_display": ["status"],
+        }
 
     def get_status_display(self, obj):
         return obj.get_status_display()
@@ -79,11 +113,16 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fileds = ["id",]
 
 
-class DocumentListSerializer(serializers.ModelSerializer):
+class DocumentListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Document
         fields = ["id", "title", "tags", "created_date", "page_count", "thumbnail_str"]
+        expandable_fields = ["thumbnail_str"]
+        field_sources = {
+            "created_date": ["created"],
+            "thumbnail_str": ["storage_type"],
+        }
 
 
 class CorrespondentField(serializers.PrimaryKeyRelatedField):
@@ -124,7 +163,7 @@ class NotesSerializer(serializers.ModelSerializer):
         read_only_fields = ["id","created", "user"]
 
     
-class DocumentDetailSerializer(serializers.ModelSerializer):
+class DocumentDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     project = ProjectField(allow_null=True)
     correspondent = CorrespondentField(allow_null=True)
     tags = TagsField(many=True)
@@ -132,12 +171,17 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
     notes = NotesSerializer(many=True, required=False, read_only=True)
     added_date = serializers.SerializerMethodField(read_only=True)
     modified_date = serializers.SerializerMethodField(read_only=True)
-    project_display = ProjectListSerializer(read_only=True)
+    project_display = ProjectListSerializer(source="project", read_only=True)
 
     class Meta:
         model = Document
-        fields = ["id", "title", "tags", "created", "page_count", "correspondent", "added_date", "modified_date", "project", "project_display", "document_type", "notes",]
-        read_only_fields = ["page_count", "notes"]
+        fields = ["id", "title", "tags", "created", "page_count", "correspondent", "added_date", "modified_date", "project", "project_display", "document_type", "notes", "processing_status", "failure_reason",]
+        read_only_fields = ["page_count", "notes", "processing_status", "failure_reason"]
+        expandable_fields = ["notes", "project_display"]
+        field_sources = {
+            "added_date": ["added"],
+            "modified_date": ["modified"],
+        }
         # extra_kwargs = {
         #     'created': {'write_only': True},
         # }
@@ -148,6 +192,14 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
     def get_modified_date(self, obj):
         return timezone.localdate(obj.modified)
         
+class DocumentExportSerializer(DocumentDetailSerializer):
+
+    class Meta(DocumentDetailSerializer.Meta):
+        fields = DocumentDetailSerializer.Meta.fields + [
+            "mime_type", "checksum", "archive_checksum", "original_filename",
+        ]
+
+
 class PostDocumentSerializer(serializers.Serializer):
     created = serializers.DateTimeField(
         label="Created",
@@ -198,6 +250,14 @@ class PostDocumentSerializer(serializers.Serializer):
         required=False,
     )
 
+    priority = serializers.ChoiceField(
+        choices=PRIORITIES,
+        default=INTERACTIVE,
+        label="Priority",
+        write_only=True,
+        help_text="Scripted and batch uploads should use bulk, so they do not delay uploads from the UI.",
+    )
+
     SUPPORTED_MIME_TYPES = [
         # PDF
         'application/pdf',
@@ -255,4 +315,256 @@ class PostDocumentSerializer(serializers.Serializer):
             return [tag.id for tag in tags]
         else:
             return None
-        
+
+
+class BulkEditSerializer(serializers.Serializer):
+    documents = serializers.ListField(
+        child=serializers.IntegerField(),
+        label="Documents",
+        required=False,
+        help_text="Ids of the documents to edit.",
+    )
+
+    query = serializers.DictField(
+        label="Query",
+        required=False,
+        help_text="Document filter parameters selecting the documents to edit.",
+    )
+
+    add_tags = serializers.PrimaryKeyRelatedField(
+        many=True,
+        queryset=Tag.objects.all(),
+        label="Add tags",
+        required=False,
+    )
+
+    remove_tags = serializers.PrimaryKeyRelatedField(
+        many=True,
+        queryset=Tag.objects.all(),
+        label="Remove tags",
+        required=False,
+    )
+
+    set_project = serializers.PrimaryKeyRelatedField(
+        queryset=Project.objects.all(),
+        label="Project",
+        allow_null=True,
+        required=False,
+    )
+
+    set_document_type = serializers.PrimaryKeyRelatedField(
+        queryset=DocumentType.objects.all(),
+        label="Document type",
+        allow_null=True,
+        required=False,
+    )
+
+    set_correspondent = serializers.PrimaryKeyRelatedField(
+        queryset=Correspondent.objects.all(),
+        label="Correspondent",
+        allow_null=True,
+        required=False,
+    )
+
+    OPERATIONS = ["add_tags", "remove_tags", "set_project", "set_document_type", "set_correspondent"]
+
+    def validate(self, attrs):
+        if ("documents" in attrs) == ("query" in attrs):
+            raise serializers.ValidationError("Provide either documents or query.")
+        if not any(operation in attrs for operation in self.OPERATIONS):
+            raise serializers.ValidationError(
+                f"Provide at least one operation: {', '.join(self.OPERATIONS)}."
+            )
+        return attrs
+
+
+class RedriveSerializer(serializers.Serializer):
+    documents = serializers.ListField(
+        child=serializers.IntegerField(),
+        label="Documents",
+        required=False,
+        help_text="Ids of the failed documents to re-drive; all failed documents by default.",
+    )
+
+    reasons = serializers.MultipleChoiceField(
+        choices=FAILURE_REASONS,
+        label="Reasons",
+        required=False,
+        help_text="Only re-drive documents that failed for one of these reasons.",
+    )
+
+    priority = serializers.ChoiceField(
+        choices=PRIORITIES,
+        default=BULK,
+        label="Priority",
+    )
+
+
+class ValuesSerializer:
+    """
+    Render the output of a regular serializer from ``values()`` rows instead
+    of model instances, for high-volume read-only list endpoints.
+
+    Concrete columns and foreign keys are read from the values() rows, and
+    many-to-many primary keys from one query on the through table. Fields
+    that read a property or a method are computed by ``get_<field>(row)``
+    from the columns listed in ``Meta.field_sources``. Nested serializers are
+    rendered by the values serializer named in ``nested_serializers``, with
+    one query per relation for the whole batch of rows.
+    """
+    COLUMN = "column"
+    RELATED = "related"
+    MANY = "many"
+    NESTED = "nested"
+    COMPUTED = "computed"
+
+    nested_serializers = {}
+
+    def __init__(self, serializer):
+        meta = serializer.Meta
+        opts = meta.model._meta
+        field_sources = getattr(meta, "field_sources", {})
+
+        self.pk_name = opts.pk.attname
+        self.columns = [self.pk_name]
+        self.many_fields = {}
+        self.nested_fields = {}
+        self.readers = []
+
+        for field_name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            method = getattr(self, f"get_{field_name}", None)
+            if method is not None:
+                for source in field_sources.get(field_name, []):
+                    self.add_column(opts.get_field(source).attname)
+                self.readers.append((field_name, self.COMPUTED, method))
+                continue
+
+            model_field = opts.get_field(field.source)
+            if isinstance(field, serializers.BaseSerializer):
+                nested = self.nested_serializers[field_name](getattr(field, "child", field))
+                if model_field.many_to_one:
+                    self.add_column(model_field.attname)
+                self.nested_fields[field_name] = (model_field, nested)
+                self.readers.append((field_name, self.NESTED, None))
+            elif model_field.many_to_many:
+                self.many_fields[field_name] = model_field
+                self.readers.append((field_name, self.MANY, None))
+            elif model_field.is_relation:
+                self.add_column(model_field.attname)
+                self.readers.append((field_name, self.RELATED, model_field.attname))
+            else:
+                self.add_column(model_field.attname)
+                self.readers.append((field_name, self.COLUMN, (model_field.attname, field)))
+
+    def add_column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    def get_many_values(self, model_field, ids):
+        through = model_field.remote_field.through
+        source = model_field.m2m_field_name()
+        target = model_field.m2m_reverse_field_name()
+
+        values = defaultdict(list)
+        rows = (
+            through.objects
+            .filter(**{f"{source}_id__in": ids})
+            .order_by(f"{target}_id")
+            .values_list(f"{source}_id", f"{target}_id")
+        )
+        for source_id, target_id in rows:
+            values[source_id].append(target_id)
+        return values
+
+    def get_nested_values(self, model_field, nested, rows, ids):
+        related_manager = model_field.related_model._default_manager
+
+        if model_field.many_to_one:
+            related_ids = {row[model_field.attname] for row in rows} - {None}
+            related_rows = list(related_manager.filter(pk__in=related_ids).values(*nested.columns))
+            return {
+                row[nested.pk_name]: item
+                for row, item in zip(related_rows, nested.to_representation(related_rows))
+            }
+
+        # Reverse foreign key: group the related rows under their parent.
+        parent_column = model_field.field.attname
+        columns = list(nested.columns)
+        if parent_column not in columns:
+            columns.append(parent_column)
+        related_rows = list(related_manager.filter(**{f"{parent_column}__in": ids}).values(*columns))
+        values = defaultdict(list)
+        for row, item in zip(related_rows, nested.to_representation(related_rows)):
+            values[row[parent_column]].append(item)
+        return values
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        ids = [row[self.pk_name] for row in rows]
+        many_values = {
+            field_name: self.get_many_values(model_field, ids)
+            for field_name, model_field in self.many_fields.items()
+        }
+        nested_values = {
+            field_name: self.get_nested_values(model_field, nested, rows, ids)
+            for field_name, (model_field, nested) in self.nested_fields.items()
+        }
+
+        data = []
+        for row in rows:
+            item = {}
+            for field_name, kind, reader in self.readers:
+                if kind == self.COLUMN:
+                    column, field = reader
+                    value = row[column]
+                    item[field_name] = None if value is None else field.to_representation(value)
+                elif kind == self.RELATED:
+                    item[field_name] = row[reader]
+                elif kind == self.MANY:
+                    item[field_name] = many_values[field_name].get(row[self.pk_name], [])
+                elif kind == self.NESTED:
+                    model_field, nested = self.nested_fields[field_name]
+                    if model_field.many_to_one:
+                        item[field_name] = nested_values[field_name].get(row[model_field.attname])
+                    else:
+                        item[field_name] = nested_values[field_name].get(row[self.pk_name], [])
+                else:
+                    item[field_name] = reader(row)
+            data.append(item)
+        return data
+
+
+class DocumentListValuesSerializer(ValuesSerializer):
+
+    def get_created_date(self, row):
+        return row["created"]
+
+    def get_thumbnail_str(self, row):
+        return Document(pk=row["id"], storage_type=row["storage_type"]).thumbnail_str
+
+
+class ProjectValuesSerializer(ValuesSerializer):
+    status_labels = dict(Project.STATUS_CHOICES)
+
+    def get_status_display(self, row):
+        return force_str(self.status_labels.get(row["status"], row["status"]))
+
+
+class NotesValuesSerializer(ValuesSerializer):
+    pass
+
+
+class DocumentExportValuesSerializer(ValuesSerializer):
+    nested_serializers = {
+        "project_display": ValuesSerializer,
+        "notes": NotesValuesSerializer,
+    }
+
+    def get_added_date(self, row):
+        return timezone.localdate(row["added"])
+
+    def get_modified_date(self, row):
+        return timezone.localdate(row["modified"])
@@ -0,0 +1,283 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+ORIGINALS = "originals"
+ARCHIVE = "archive"
+THUMBNAILS = "thumbnails"
+
+AREAS = (ORIGINALS, ARCHIVE, THUMBNAILS)
+
+# Files set aside by the garbage collector, kept under each area.
+QUARANTINE_PREFIX = "quarantine/"
+
+MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+@cache
+def default_file_mode():
+    """
+    Return the mode ``open()`` gives new files under the process umask.
+    mkstemp creates files readable by the owner only, which the web server
+    and backup jobs may not be.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class LocalStorage:
+    """
+    Files in a directory on a local (or shared) filesystem.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, name):
+        return self.root / name
+
+    def open(self, name, offset=0):
+        f = open(self.path(name), "rb")
+        if offset:
+            f.seek(offset)
+        return f
+
+    def save(self, name, content):
+        """
+        Write ``content`` (bytes or a binary file object) to ``name``. The
+        file is written next to its target and renamed into place, so readers
+        never see a partial file.
+        """
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(content, bytes):
+                    f.write(content)
+                else:
+                    shutil.copyfileobj(content, f, MULTIPART_CHUNK_SIZE)
+            os.chmod(tmp_path, default_file_mode())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def save_file(self, name, path, move=False):
+        """
+        Store the local file at ``path`` as ``name``. With ``move`` the file
+        is renamed into place when both are on the same filesystem.
+        """
+        if move:
+            self.path(name).parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(path, self.path(name))
+        else:
+            with open(path, "rb") as f:
+                self.save(name, f)
+
+    def move(self, name, new_name):
+        self.path(new_name).parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path(name), self.path(new_name))
+
+    def delete(self, name):
+        self.path(name).unlink(missing_ok=True)
+
+    def exists(self, name):
+        return self.path(name).exists()
+
+    def size(self, name):
+        return self.path(name).stat().st_size
+
+    def listdir(self, prefix=""):
+        """
+        Yield ``(name, size, modified)`` for every file in the storage whose
+        name starts with the directory ``prefix``.
+        """
+        for root, _, files in os.walk(self.root / prefix):
+            for file_name in files:
+                path = Path(root) / file_name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+                yield str(path.relative_to(self.root)), stat.st_size, modified
+
+    def url(self, name, filename=None, mime_type=None):
+        """
+        Local files have no direct download URL; they are served by the API.
+        """
+        return None
+
+    @contextmanager
+    def local_path(self, name):
+        yield self.path(name)
+
+
+class S3Storage:
+    """
+    Files under ``prefix`` in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Reads stream the object body, writes go through boto3's managed
+    transfer which switches to a multipart upload for large files, and
+    downloads can be handed to the client as presigned URLs.
+    """
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/"
+        self.client = s3_client(settings.S3_ENDPOINT_URL)
+
+    def key(self, name):
+        return self.prefix + name
+
+    def open(self, name, offset=0):
+        params = {"Bucket": self.bucket, "Key": self.key(name)}
+        if offset:
+            params["Range"] = f"bytes={offset}-"
+        try:
+            return self.client.get_object(**params)["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(name)
+
+    def save(self, name, content):
+        from boto3.s3.transfer import TransferConfig
+
+        if isinstance(content, bytes):
+            self.client.put_object(Bucket=self.bucket, Key=self.key(name), Body=content)
+            return
+        self.client.upload_fileobj(
+            content,
+            self.bucket,
+            self.key(name),
+            Config=TransferConfig(
+                multipart_threshold=MULTIPART_CHUNK_SIZE,
+                multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            ),
+        )
+
+    def save_file(self, name, path, move=False):
+        with open(path, "rb") as f:
+            self.save(name, f)
+        if move:
+            os.unlink(path)
+
+    def move(self, name, new_name):
+        # copy() switches to a multipart copy for objects over 5 GB.
+        self.client.copy({"Bucket": self.bucket, "Key": self.key(name)}, self.bucket, self.key(new_name))
+        self.delete(name)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    def head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def size(self, name):
+        head = self.head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["ContentLength"]
+
+    def listdir(self, prefix=""):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.key(prefix)):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["Size"], item["LastModified"]
+
+    def url(self, name, filename=None, mime_type=None):
+        """
+        Return a presigned GET URL valid for ``S3_PRESIGNED_URL_EXPIRY``
+        seconds, downloading as ``filename`` when given.
+        """
+        params = {"Bucket": self.bucket, "Key": self.key(name)}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        if mime_type:
+            params["ResponseContentType"] = mime_type
+        # Sign against the endpoint browsers can reach, which differs from
+        # the internal one when MinIO runs next to the app.
+        client = s3_client(settings.S3_PUBLIC_ENDPOINT_URL or settings.S3_ENDPOINT_URL)
+        return client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=settings.S3_PRESIGNED_URL_EXPIRY
+        )
+
+    @contextmanager
+    def local_path(self, name):
+        """
+        Download the object to a temporary file for tools that need a path.
+        """
+        from botocore.exceptions import ClientError
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / Path(name).name
+            try:
+                self.client.download_file(self.bucket, self.key(name), str(path))
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    raise FileNotFoundError(name) from e
+                raise
+            yield path
+
+
+@contextmanager
+def local_copy(fileobj, name):
+    """
+    Copy the binary file ``fileobj`` to a temporary file called ``name``
+    and yield its path, for tools that cannot read from a stream.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / Path(name).name
+        with fileobj, open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, MULTIPART_CHUNK_SIZE)
+        yield path
+
+
+@cache
+def s3_client(endpoint_url):
+    try:
+        import boto3
+    except ImportError:
+        raise ImproperlyConfigured("STORAGE_BACKEND=s3 requires the boto3 package")
+
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name=settings.S3_REGION,
+        aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+    )
+
+
+def get_storage(area):
+    """
+    Return the storage for ``area`` (``ORIGINALS``, ``ARCHIVE`` or
+    ``THUMBNAILS``) according to ``STORAGE_BACKEND``.
+    """
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(settings.S3_BUCKET, area)
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage({
+            ORIGINALS: settings.ORIGINAL_DIR,
+            ARCHIVE: settings.ARCHIVE_DIR,
+            THUMBNAILS: settings.THUMBNAIL_DIR,
+        }[area])
+    raise ImproperlyConfigured(f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}")
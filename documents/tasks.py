@@ -1,109 +1,310 @@
-import os
-import subprocess
+import io
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 from PIL import Image
 import magic
 from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
 from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from django.utils import timezone
 import logging
 from documents.models import Document
+from documents.storage import get_storage, AREAS, ORIGINALS, ARCHIVE
+from documents.compression import compress_file, worth_compressing, SAMPLE_SIZE
+from documents.scrubber import Scrubber
+from documents.garbage import collect_garbage
+from documents.trash import purge_trash
+from documents.thumbnails import thumbnail_pack, render_thumbnails, bundle_thumbnails
+from documents.previews import preview_cache, PREFETCH_PAGES
+from documents.crypto import encrypt_bytes
+from documents.optimization import ghostscript_args
+from documents.metadata import read_document_metadata, METADATA_FIELDS
+from documents.images import image_to_pdf, IMAGE_MIME_TYPES
+from documents.watchdog import run_tool, FAILURE_ERROR, FAILURE_MEMORY, FAILURE_MISSING, FAILURE_UNAVAILABLE
+from documents.bulk_edit import batched_ids
+from documents import events
+from documents.events import publish_event
+from documents.priorities import BULK
+import math
 import hashlib
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def process_document(document_id):
+# Failures that may go away on their own: the OOM killer under memory
+# pressure on the node, a tool missing from a half-deployed worker, storage
+# or database outages. Malformed input and input needing more than the
+# memory limit fail the same way every time and are not retried.
+TRANSIENT_FAILURES = {FAILURE_MEMORY, FAILURE_MISSING, FAILURE_UNAVAILABLE}
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, InterfaceError, OperationalError)
+
+@shared_task(bind=True, max_retries=None)
+def process_document(self, document_id):
     """
     Main task that processes a document after upload:
     1. Generate PDF/A archive
-    2. Generate thumbnail
+    2. Extract page count and PDF metadata
+    3. Generate thumbnail
+    4. Compress the original, if COMPRESS_ORIGINALS is enabled
+    
+    Transient failures are retried with exponential backoff up to
+    PROCESSING_MAX_RETRIES times; the document then ends up failed, the
+    dead-letter set re-driven by redrive_documents()
     """
     
     try:
         document = Document.objects.get(pk=document_id)
-        
-        # Generate PDF/A first
-        success = generate_pdf_archive(document)
-        if success:
-            # Then generate thumbnail from the PDF/A
-            generate_thumbnail(document)
-        
-        return {"status": "success", "document_id": document_id}
     except Document.DoesNotExist:
         logger.error(f"Document with ID {document_id} not found")
         return {"status": "error", "message": f"Document with ID {document_id} not found"}
+    except TRANSIENT_ERRORS as e:
+        # Nothing can be recorded on the document, so the attempts are
+        # counted by the task; past the limit redrive_stalled_documents
+        # picks the document up.
+        if self.request.retries >= settings.PROCESSING_MAX_RETRIES:
+            raise
+        countdown = get_exponential_backoff_interval(
+            settings.PROCESSING_RETRY_DELAY, self.request.retries,
+            settings.PROCESSING_RETRY_MAX_DELAY, full_jitter=True,
+        )
+        logger.warning(f"Retrying document {document_id} in {countdown} seconds: {str(e)}")
+        raise self.retry(exc=e, countdown=countdown)
+    
+    if document.processing_status == Document.PROCESSING_DONE:
+        # Queued twice, e.g. re-driven while still in the queue
+        return {"status": "success", "document_id": document_id}
+    
+    try:
+        document.processing_attempts += 1
+        set_processing_status(document, Document.PROCESSING_RUNNING, ['processing_attempts'])
+        if document.failure_reason:
+            record_failure(document, None)
+        
+        # Generate PDF/A first, unless an earlier attempt did
+        if not document.has_archive_version:
+            publish_event(document_id, events.CONVERTING)
+        success = document.has_archive_version or generate_pdf_archive(document)
+        extract_metadata(document)
+        if success:
+            # Then generate thumbnail from the PDF/A
+            publish_event(document_id, events.THUMBNAILING)
+            success = generate_thumbnail(document)
     except Exception as e:
         logger.error(f"Error processing document {document_id}: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        record_failure(document, e, "processing")
+        success = False
+    
+    if not success and document.failure_reason in TRANSIENT_FAILURES \
+            and document.processing_attempts <= settings.PROCESSING_MAX_RETRIES:
+        countdown = get_exponential_backoff_interval(
+            settings.PROCESSING_RETRY_DELAY, document.processing_attempts - 1,
+            settings.PROCESSING_RETRY_MAX_DELAY, full_jitter=True,
+        )
+        logger.warning(f"Retrying document {document_id} in {countdown} seconds: {document.failure_message}")
+        set_processing_status(document, Document.PROCESSING_RETRYING)
+        publish_event(document_id, events.RETRYING, countdown=countdown)
+        raise self.retry(countdown=countdown)
+    
+    # Compress last, as the steps above read the original
+    if settings.COMPRESS_ORIGINALS:
+        compress_original(document)
+    
+    if not success:
+        set_processing_status(document, Document.PROCESSING_FAILED)
+        publish_event(document_id, events.FAILED, reason=document.failure_reason)
+        return {"status": "error", "message": document.failure_message}
+    set_processing_status(document, Document.PROCESSING_DONE)
+    publish_event(document_id, events.DONE)
+    return {"status": "success", "document_id": document_id}
+
+
+def set_processing_status(document, processing_status, update_fields=()):
+    document.processing_status = processing_status
+    document.processing_updated = timezone.now()
+    document.save(update_fields=['processing_status', 'processing_updated', *update_fields])
+
+
+def redrive_documents(queryset, priority=BULK):
+    """
+    Reset the attempts of the documents in ``queryset`` and queue them for
+    processing again with ``priority``. Returns the number of documents
+    queued.
+    """
+    
+    queued = 0
+    with process_document.app.producer_or_acquire() as producer:
+        for batch in batched_ids(queryset):
+            Document.objects.filter(pk__in=batch).update(
+                processing_status=Document.PROCESSING_QUEUED,
+                processing_attempts=0,
+                processing_updated=timezone.now(),
+            )
+            for document_id in batch:
+                process_document.apply_async((document_id,), producer=producer, queue=priority)
+                publish_event(document_id, events.QUEUED)
+            queued += len(batch)
+    return queued
+
 
 @shared_task
-def generate_pdf_archive(document):
+def generate_pdf_archive(document, profile=None):
     """
-    Convert document to PDF/A format using LibreOffice and GhostScript
+    Convert document to PDF/A format using LibreOffice and GhostScript,
+    optimized with the given profile (ARCHIVE_PROFILE by default, or
+    IMAGE_ARCHIVE_PROFILE for images)
     """
     
     if isinstance(document, int):
         document = Document.objects.get(pk=document)
     
-    source_path = document.source_path
+    profile = profile or default_archive_profile(document.mime_type)
     source_mime = document.mime_type
     
-    # Create output directory if it doesn't exist
-    os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
-    
     # Base filename for the archive (without extension)
     archive_base = f"{document.checksum}_archive"
-    final_output_path = Path(settings.ARCHIVE_DIR) / f"{archive_base}.pdf"
     
     try:
-        # If source is already PDF, convert directly with GhostScript
-        if source_mime == 'application/pdf':
-            pdf_path = source_path
-        else:
-            # Convert to PDF with LibreOffice first
-            subprocess.run([
-                'libreoffice', '--headless', '--convert-to', 'pdf',
-                '--outdir', str(settings.ARCHIVE_DIR),
-                str(source_path)
-            ], check=True)
+        # Work on local copies so the storage backend can be remote
+        with document.source_local_path() as source_path, \
+                tempfile.TemporaryDirectory() as work_dir:
+            final_output_path = Path(work_dir) / f"{archive_base}.pdf"
+
+            # If source is already PDF, convert directly with GhostScript
+            if source_mime == 'application/pdf':
+                pdf_path = source_path
+            elif source_mime in IMAGE_MIME_TYPES:
+                # Wrap raster images into a PDF without starting LibreOffice
+                pdf_path = Path(work_dir) / "image.pdf"
+                image_to_pdf(source_path, pdf_path)
+            else:
+                # Convert to PDF with LibreOffice first
+                run_tool([
+                    'libreoffice', '--headless', '--convert-to', 'pdf',
+                    '--outdir', work_dir,
+                    str(source_path)
+                ])
+                
+                # LibreOffice output filename
+                pdf_path = Path(work_dir) / f"{Path(source_path).stem}.pdf"
             
-            # LibreOffice output filename
-            lo_output = Path(settings.ARCHIVE_DIR) / f"{Path(source_path).stem}.pdf"
-            pdf_path = lo_output
-        
-        # Convert to PDF/A using GhostScript
-        subprocess.run([
-            'gs', '-dPDFA', '-dBATCH', '-dNOPAUSE', '-dSAFER',
-            '-sDEVICE=pdfwrite',
-            '-sColorConversionStrategy=UseDeviceIndependentColor',
-            '-dPDFACompatibilityPolicy=1',
-            f'-sOutputFile={str(final_output_path)}',
-            str(pdf_path)
-        ], check=True)
-        
-        # Clean up temporary PDF if it was created
-        if source_mime != 'application/pdf' and pdf_path != source_path:
-            os.remove(pdf_path)
-        
-        # Update document model with archive information
-        with open(final_output_path, 'rb') as f:
-            archive_data = f.read()
-            archive_checksum = document.archive_checksum = hashlib.md5(archive_data).hexdigest()
+            # Convert to PDF/A-2 using GhostScript
+            run_tool([
+                'gs', '-dPDFA=2', '-dBATCH', '-dNOPAUSE', '-dSAFER',
+                '-sDEVICE=pdfwrite',
+                '-sColorConversionStrategy=UseDeviceIndependentColor',
+                '-dPDFACompatibilityPolicy=1',
+                f'-sOutputFile={str(final_output_path)}',
+                *ghostscript_args(profile, pdf_path)
+            ])
+            
+            input_size = Path(pdf_path).stat().st_size
+            output_size = final_output_path.stat().st_size
+            logger.info(
+                f"Archive of document {document.id}: {input_size} -> {output_size} bytes "
+                f"with the {profile} profile"
+            )
+            
+            # Update document model with archive information; the checksum
+            # is always that of the plain PDF
+            archive_checksum = file_checksum(final_output_path)
+            document.archive_filename = f"{archive_base}.pdf"
+            if document.is_encrypted:
+                with open(final_output_path, 'rb') as f:
+                    document.save_stored(ARCHIVE, document.archive_name, f)
+            else:
+                get_storage(ARCHIVE).save_file(document.archive_name, final_output_path, move=True)
         
-        document.archive_filename = f"{archive_base}.pdf"
         document.archive_checksum = archive_checksum
-        document.save(update_fields=['archive_filename', 'archive_checksum'])
+        document.archive_profile = profile
+        document.archive_input_size = input_size
+        document.archive_output_size = output_size
+        document.save(update_fields=[
+            'archive_filename', 'archive_checksum', 'archive_profile', 'archive_input_size', 'archive_output_size',
+        ])
+        # Cached previews were rendered from the previous archive
+        preview_cache().delete(document.pk)
         
         return True
     
     except Exception as e:
         logger.error(f"Failed to generate PDF/A for document {document.id}: {str(e)}")
+        record_failure(document, e, "archive")
+        return False
+
+def record_failure(document, error, step=None):
+    """
+    Save why ``step`` failed on the document, or clear the failure when
+    ``error`` is None
+    """
+    
+    if error is None:
+        document.failure_reason = ""
+        document.failure_message = ""
+    else:
+        transient = isinstance(error, TRANSIENT_ERRORS)
+        document.failure_reason = getattr(error, "reason", FAILURE_UNAVAILABLE if transient else FAILURE_ERROR)
+        document.failure_message = f"{step}: {error}"
+    document.save(update_fields=['failure_reason', 'failure_message'])
+
+def default_archive_profile(mime_type):
+    if mime_type in IMAGE_MIME_TYPES:
+        return settings.IMAGE_ARCHIVE_PROFILE
+    return settings.ARCHIVE_PROFILE
+
+@shared_task
+def extract_metadata(document):
+    """
+    Read page count, producer, author, creation date and page size from
+    the archive without rendering it
+    """
+    
+    if isinstance(document, int):
+        document = Document.objects.get(pk=document)
+    
+    try:
+        metadata = read_document_metadata(document)
+        if metadata is None:
+            return False
+        
+        apply_metadata(document, metadata)
+        document.save(update_fields=[*METADATA_FIELDS, 'created'])
+        return True
+    
+    except Exception as e:
+        logger.error(f"Failed to extract metadata of document {document.id}: {str(e)}")
+        return False
+
+
+def apply_metadata(document, metadata):
+    for field, value in metadata.items():
+        setattr(document, field, value)
+    # The embedded date is the best guess until someone sets one
+    if document.created is None:
+        document.created = metadata["pdf_created"]
+
+
+@shared_task
+def optimize_archive(document_id, profile=None):
+    """
+    Regenerate the archive of a document from its original with another
+    optimization profile, by default the one configured for its type
+    """
+    
+    try:
+        document = Document.objects.get(pk=document_id)
+    except Document.DoesNotExist:
+        return False
+    profile = profile or default_archive_profile(document.mime_type)
+    if not document.has_archive_version or document.archive_profile == profile:
         return False
+    return generate_pdf_archive(document, profile)
 
 @shared_task
 def generate_thumbnail(document):
     """
-    Generate thumbnail from the first page of the PDF/A archive
+    Generate thumbnails in several sizes and formats from the first page
+    of the PDF/A archive
     """
     
     if isinstance(document, int):
@@ -115,34 +316,222 @@ def generate_thumbnail(document):
         return False
     
     try:
-        # Create thumbnail directory if it doesn't exist
-        os.makedirs(settings.THUMBNAIL_DIR, exist_ok=True)
-        
         # Use the archive file to generate the thumbnail
-        archive_path = document.archive_path
-        thumbnail_path = document.thumbnail_path
+        with document.archive_local_path() as archive_path, \
+                tempfile.TemporaryDirectory() as work_dir:
+            # Convert first page of PDF to image using GhostScript
+            temp_png = Path(work_dir) / f"{document.pk:07}_temp.png"
+            run_tool([
+                'gs', '-dNOPAUSE', '-dBATCH', '-dSAFER',
+                '-sDEVICE=png16m',
+                '-dFirstPage=1', '-dLastPage=1',
+                '-r150',
+                f'-sOutputFile={str(temp_png)}',
+                str(archive_path)
+            ])
+            
+            # Scale the one raster to every thumbnail size and format
+            with Image.open(temp_png) as img:
+                variants = render_thumbnails(img)
         
-        # Convert first page of PDF to image using GhostScript
-        temp_png = Path(settings.THUMBNAIL_DIR) / f"{document.pk:07}_temp.png"
-        subprocess.run([
-            'gs', '-dNOPAUSE', '-dBATCH', '-dSAFER',
-            '-sDEVICE=png16m',
-            '-dFirstPage=1', '-dLastPage=1',
-            '-r150',
-            f'-sOutputFile={str(temp_png)}',
-            str(archive_path)
-        ], check=True)
+        document.save_thumbnail(bundle_thumbnails(variants))
         
-        # Resize and convert to WebP format
-        with Image.open(temp_png) as img:
-            img.thumbnail((500, 500))  # Resize to thumbnail size
-            img.save(str(thumbnail_path), 'WEBP', quality=75)
+        return True
+    
+    except Exception as e:
+        logger.error(f"Failed to generate thumbnail for document {document.id}: {str(e)}")
+        record_failure(document, e, "thumbnail")
+        return False
+
+
+def queue_previews(document, first_page, width):
+    """
+    Queue a render of ``first_page`` and the PREFETCH_PAGES after it, skipping
+    pages that are cached or already being rendered
+    """
+    
+    last_page = first_page + PREFETCH_PAGES
+    if document.page_count:
+        last_page = min(last_page, document.page_count)
+    cache = preview_cache()
+    pages = [page for page in range(first_page, last_page + 1) if cache.claim(document.pk, page, width)]
+    if pages:
+        render_previews.delay(document.pk, pages, width)
+    return pages
+
+
+@shared_task
+def render_previews(document_id, pages, width):
+    """
+    Render ``pages`` of the archive as WebP previews ``width`` pixels wide
+    into the preview cache, with one GhostScript run for the whole range
+    """
+    
+    cache = preview_cache()
+    try:
+        document = Document.objects.get(pk=document_id)
+        first_page, last_page = min(pages), max(pages)
+        # Render at roughly the target width for an A4 or letter page.
+        resolution = max(36, math.ceil(width / 8.27))
         
-        # Clean up temporary PNG
-        os.remove(temp_png)
+        with document.archive_local_path() as archive_path, \
+                tempfile.TemporaryDirectory() as work_dir:
+            run_tool([
+                'gs', '-dNOPAUSE', '-dBATCH', '-dSAFER', '-dQUIET',
+                '-sDEVICE=png16m',
+                f'-dFirstPage={first_page}', f'-dLastPage={last_page}',
+                f'-r{resolution}',
+                f'-sOutputFile={work_dir}/%05d.png',
+                str(archive_path)
+            ])
+            
+            for page in pages:
+                png = Path(work_dir) / f"{page - first_page + 1:05}.png"
+                if not png.exists():
+                    # Past the last page
+                    continue
+                preview = io.BytesIO()
+                with Image.open(png) as img:
+                    img.thumbnail((width, width * 4))
+                    img.save(preview, 'WEBP', quality=80)
+                data = preview.getvalue()
+                if document.is_encrypted:
+                    data = encrypt_bytes(data)
+                cache.put(document_id, page, width, data)
         
         return True
     
     except Exception as e:
-        logger.error(f"Failed to generate thumbnail for document {document.id}: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error(f"Failed to render previews of document {document_id}: {str(e)}")
+        return False
+    
+    finally:
+        for page in pages:
+            cache.release(document_id, page, width)
+        cache.evict()
+
+
+@shared_task
+def compress_original(document):
+    """
+    Replace the original with a zstd-compressed copy, unless it is already
+    compressed or does not compress well
+    """
+    
+    if isinstance(document, int):
+        document = Document.objects.get(pk=document)
+    
+    if document.compression != Document.COMPRESSION_NONE:
+        return False
+    
+    plain_name = document.source_name
+    
+    try:
+        # Probe a sample first so incompressible files are never fully read
+        with document.source_file as f:
+            sample = f.read(SAMPLE_SIZE)
+        if not worth_compressing(sample, document.mime_type):
+            # Originals never change, so the probe is not repeated
+            document.compression_probed = True
+            document.save(update_fields=['compression_probed'])
+            return False
+        
+        with document.source_local_path() as source_path:
+            with tempfile.TemporaryFile() as compressed:
+                compress_file(source_path, compressed, Path(source_path).stat().st_size)
+                compressed.seek(0)
+                # Encrypted originals are compressed before being encrypted
+                document.compression = Document.COMPRESSION_ZSTD
+                document.save_stored(ORIGINALS, document.source_name, compressed)
+        
+        # Only drop the plain copy once the row points at the compressed one
+        document.save(update_fields=['compression'])
+        get_storage(ORIGINALS).delete(plain_name)
+        
+        return True
+    
+    except Exception as e:
+        document.refresh_from_db(fields=['compression'])
+        logger.error(f"Failed to compress original of document {document.id}: {str(e)}")
+        return False
+
+
+@shared_task
+def scrub_storage(workers=2, bandwidth=None, max_age_days=30):
+    """
+    Verify the stored files of documents not verified in the last
+    max_age_days; meant to be scheduled with celery beat
+    """
+    
+    stats, problems = Scrubber(
+        workers=workers, bandwidth=bandwidth, max_age=timedelta(days=max_age_days)
+    ).run()
+    return {"status": "success", **stats}
+
+
+@shared_task
+def collect_storage_garbage(grace_hours=24):
+    """
+    Quarantine stored files no document refers to; meant to be scheduled
+    with celery beat
+    """
+    
+    collected = {
+        area: sum(1 for _ in collect_garbage(area, grace=timedelta(hours=grace_hours)))
+        for area in AREAS
+    }
+    return {"status": "success", **collected}
+
+
+@shared_task
+def purge_trash_task():
+    """
+    Permanently delete documents and notes that have been in the trash
+    longer than TRASH_RETENTION_DAYS; meant to be scheduled with celery beat
+    """
+    
+    documents, notes = purge_trash(timedelta(days=settings.TRASH_RETENTION_DAYS))
+    return {"status": "success", "documents": documents, "notes": notes}
+
+
+@shared_task
+def compact_thumbnails():
+    """
+    Drop thumbnails of deleted documents from the thumbnail pack and
+    rewrite mostly dead segments; meant to be scheduled with celery beat
+    """
+    
+    if not settings.PACK_THUMBNAILS:
+        return {"status": "skipped"}
+    segments, reclaimed = thumbnail_pack().compact(existing=existing_document_ids)
+    return {"status": "success", "segments": segments, "bytes": reclaimed}
+
+
+@shared_task
+def redrive_stalled_documents(hours=None):
+    """
+    Queue again documents whose processing status has not changed in
+    PROCESSING_STALL_HOURS, e.g. because a worker died or the broker lost
+    their task; meant to be scheduled with celery beat
+    """
+    
+    cutoff = timezone.now() - timedelta(hours=hours or settings.PROCESSING_STALL_HOURS)
+    stalled = Document.objects.filter(
+        processing_status__in=[
+            Document.PROCESSING_QUEUED, Document.PROCESSING_RUNNING, Document.PROCESSING_RETRYING,
+        ],
+        processing_updated__lt=cutoff,
+    )
+    return {"status": "success", "documents": redrive_documents(stalled)}
+
+
+def existing_document_ids(ids):
+    return set(Document.global_objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+
+def file_checksum(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+    return md5.hexdigest()
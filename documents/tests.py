@@ -1,3 +1,209 @@
-from django.test import TestCase
+import io
+import json
+import random
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from documents.crypto import CHUNK_SIZE, DecryptingReader, DecryptionError, decrypt_bytes, encrypt_bytes
+from documents.models import Document, Note, Project, Tag
+from documents.serializers import (
+    DocumentExportSerializer,
+    DocumentListSerializer,
+    NotesSerializer,
+    ProjectSerializer,
+)
+from documents.storage import get_storage, THUMBNAILS
+from documents.thumbnails import ThumbnailPack
+from documents.zipstream import ZipStream
+
+
+def render(data):
+    return json.loads(JSONRenderer().render(data))
+
+
+class ValuesListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [Tag.objects.create(name=f"Tag {i}") for i in range(3)]
+        cls.project = Project.objects.create(
+            title="Archive", status=Project.IN_PROGRESS, start_date="2025-01-02"
+        )
+        Project.objects.create(title="Other")
+
+        now = timezone.now()
+        cls.documents = []
+        for i in range(4):
+            document = Document.objects.create(
+                title=f"Document {i}",
+                project=cls.project if i % 2 else None,
+                created=now - timedelta(days=i),
+                page_count=i + 1 if i else None,
+                mime_type="application/pdf",
+                checksum=f"{i:032}",
+                filename=f"document_{i}.pdf",
+            )
+            document.tags.set(cls.tags[:i])
+            Note.objects.create(document=document, note=f"Note {i}")
+            cls.documents.append(document)
+        cls.documents[3].delete()
+
+    def setUp(self):
+        self.client = APIClient()
+        thumbnail_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(thumbnail_dir.cleanup)
+        self.enterContext(override_settings(THUMBNAIL_DIR=thumbnail_dir.name))
+        get_storage(THUMBNAILS).save(self.documents[1].thumbnail_name, b"thumbnail")
+
+    def test_document_list_matches_serializer(self):
+        response = self.client.get(reverse("document-list"))
+
+        expected = DocumentListSerializer(Document.objects.all(), many=True).data
+        self.assertEqual(response.json()["results"], render(expected))
+        self.assertEqual(response.json()["count"], 3)
+
+    def test_document_list_respects_sparse_fields(self):
+        response = self.client.get(reverse("document-list"), {"fields": "id,tags", "expand": ""})
+
+        serializer = DocumentListSerializer(
+            Document.objects.all(), many=True, context={"fields": {"id", "tags"}, "expand": set()}
+        )
+        self.assertEqual(response.json()["results"], render(serializer.data))
+        self.assertEqual(set(response.json()["results"][0]), {"id", "tags"})
+
+    def test_note_list_matches_serializer(self):
+        response = self.client.get(reverse("note-list"))
+
+        expected = NotesSerializer(Note.objects.all(), many=True).data
+        self.assertEqual(response.json(), render(expected))
+
+    def test_project_list_matches_serializer(self):
+        response = self.client.get(reverse("project-list"))
+
+        expected = ProjectSerializer(Project.objects.all(), many=True).data
+        self.assertEqual(response.json()["results"], render(expected))
+
+    def test_export_streams_ndjson_and_resumes(self):
+        response = self.client.get(reverse("document-export"))
+        lines = b"".join(response.streaming_content).splitlines()
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        expected = DocumentExportSerializer(Document.objects.order_by("pk"), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], render(expected))
+
+        first_id = json.loads(lines[0])["id"]
+        response = self.client.get(reverse("document-export"), {"after": first_id})
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [d["id"] for d in expected[1:]])
+
+
+class ThumbnailPackTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.enterContext(mock.patch("documents.thumbnails.SEGMENT_SIZE", 100))
+
+    def test_writers_share_segments_across_rollover(self):
+        # Two processes appending to the same pack
+        a, b = ThumbnailPack(self.root), ThumbnailPack(self.root)
+        data = {document_id: bytes([document_id]) * 40 for document_id in range(1, 13)}
+        for document_id, thumbnail in data.items():
+            (a if document_id % 3 else b).put(document_id, thumbnail)
+
+        self.assertGreater(len(a.segments()), 2)
+        for pack in (a, b, ThumbnailPack(self.root)):
+            self.assertEqual({i: bytes(pack.get(i)) for i in data}, data)
+
+    def test_compact_keeps_live_thumbnails(self):
+        a, b = ThumbnailPack(self.root), ThumbnailPack(self.root)
+        data = {document_id: bytes([document_id]) * 40 for document_id in range(1, 13)}
+        for document_id, thumbnail in data.items():
+            (a if document_id % 2 else b).put(document_id, thumbnail)
+        deleted = [1, 2, 3, 5, 8]
+        a.delete(deleted[:3])
+
+        segments, reclaimed = a.compact(existing=lambda ids: set(ids) - set(deleted))
+
+        self.assertGreater(segments, 0)
+        self.assertGreater(reclaimed, 0)
+        b.put(13, b"new")
+        for pack in (a, b):
+            for document_id, thumbnail in data.items():
+                if document_id in deleted:
+                    self.assertIsNone(pack.get(document_id))
+                else:
+                    self.assertEqual(bytes(pack.get(document_id)), thumbnail)
+            self.assertEqual(bytes(pack.get(13)), b"new")
+
+
+@override_settings(ENCRYPTION_KEY="test key")
+class EncryptionTests(SimpleTestCase):
+
+    sizes = [0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 3 * CHUNK_SIZE + 123]
+
+    def test_round_trip(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                data = random.randbytes(size)
+                self.assertEqual(decrypt_bytes(encrypt_bytes(data)), data)
+
+    def test_random_seeks_match_plaintext(self):
+        data = random.randbytes(3 * CHUNK_SIZE + 123)
+        encrypted = encrypt_bytes(data)
+        reader = DecryptingReader(lambda offset: io.BytesIO(encrypted[offset:]), len(encrypted))
+        rng = random.Random(0)
+        for _ in range(50):
+            start = rng.randrange(len(data) + 10)
+            size = rng.randrange(2 * CHUNK_SIZE)
+            reader.seek(start)
+            self.assertEqual(reader.read(size), data[start:start + size])
+        reader.seek(-5, io.SEEK_END)
+        self.assertEqual(reader.read(), data[-5:])
+
+    def test_truncation_is_detected(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                encrypted = encrypt_bytes(random.randbytes(size))
+                for cut in (1, 2, 16, 17, 100):
+                    if cut < len(encrypted):
+                        with self.assertRaises(DecryptionError):
+                            decrypt_bytes(encrypted[:-cut])
+
+
+class ZipStreamTests(SimpleTestCase):
+
+    def test_size_and_contents(self):
+        files = {"empty.txt": b"", "small.txt": b"hello", "größer.bin": random.randbytes(3 * 1024 * 1024 + 7)}
+        stream = ZipStream()
+        for name, data in files.items():
+            stream.add(name, len(data), lambda data=data: io.BytesIO(data))
+
+        archive = b"".join(stream)
+
+        self.assertEqual(len(archive), stream.size())
+        with zipfile.ZipFile(io.BytesIO(archive)) as zip:
+            self.assertIsNone(zip.testzip())
+            self.assertEqual({name: zip.read(name) for name in zip.namelist()}, files)
+
+    def test_zip64_end_records(self):
+        stream = ZipStream()
+        for i in range(5):
+            stream.add(f"{i}.txt", 1, lambda i=i: io.BytesIO(str(i).encode()))
+
+        with mock.patch("documents.zipstream.ZIP32_MAX_ENTRIES", 3):
+            archive = b"".join(stream)
+            self.assertEqual(len(archive), stream.size())
+
+        with zipfile.ZipFile(io.BytesIO(archive)) as zip:
+            self.assertIsNone(zip.testzip())
+            self.assertEqual(len(zip.namelist()), 5)
@@ -0,0 +1,309 @@
+import fcntl
+import io
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image, features
+
+# Thumbnails are packed into append-only segment files under
+# THUMBNAIL_DIR/packs instead of one file per document:
+#
+#   NNNNNN.seg: records of RECORD header (document id, length) + data
+#   index:      one INDEX_ENTRY (segment, offset, length) per document id,
+#               at offset id * INDEX_ENTRY.size; segment 0 means "none"
+#
+# Both are read through mmap. Writers append under an exclusive lock and
+# update the index entry only after the data is written, so readers never
+# see a partial thumbnail. Replaced and deleted thumbnails leave dead
+# records behind until compact() rewrites the segment.
+PACK_PREFIX = "packs/"
+SEGMENT_SIZE = 256 * 1024 * 1024
+RECORD = struct.Struct(">QI")
+INDEX_ENTRY = struct.Struct(">IQI")
+EMPTY_ENTRY = bytes(INDEX_ENTRY.size)
+MIN_LIVE_RATIO = 0.5
+
+
+# Every thumbnail is stored as a bundle of renditions of page 1:
+#
+#   BUNDLE_HEADER (magic, count) | count * VARIANT (format, width, length)
+#   followed by the image data of each variant in the same order
+#
+# Thumbnails written before bundles existed are a single 500px WebP.
+THUMBNAIL_SIZES = (128, 256, 512, 1024)
+THUMBNAIL_FORMATS = {"avif": "image/avif", "webp": "image/webp"}
+THUMBNAIL_QUALITY = {"avif": 50, "webp": 80}
+DEFAULT_THUMBNAIL_WIDTH = 256
+LEGACY_THUMBNAIL_WIDTH = 500
+BUNDLE_MAGIC = b"THB\x01"
+BUNDLE_HEADER = struct.Struct(">4sH")
+VARIANT = struct.Struct(">4sHI")
+
+
+class CorruptPack(IOError):
+    pass
+
+
+def thumbnail_formats():
+    # AVIF needs a Pillow built with libavif.
+    return [format for format in THUMBNAIL_FORMATS if format != "avif" or features.check("avif")]
+
+
+def render_thumbnails(image):
+    """
+    Encode ``image`` at every THUMBNAIL_SIZES width in every available
+    format and return a list of ``(format, width, data)``. Each size is
+    scaled down from the next larger one, so the page is rasterized once.
+    """
+    variants = []
+    image = image.convert("RGB")
+    for width in sorted(THUMBNAIL_SIZES, reverse=True):
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        for format in thumbnail_formats():
+            data = io.BytesIO()
+            image.save(data, format.upper(), quality=THUMBNAIL_QUALITY[format])
+            variants.append((format, width, data.getvalue()))
+    return variants
+
+
+def bundle_thumbnails(variants):
+    header = BUNDLE_HEADER.pack(BUNDLE_MAGIC, len(variants)) + b"".join(
+        VARIANT.pack(format.encode(), width, len(data)) for format, width, data in variants
+    )
+    return header + b"".join(data for _, _, data in variants)
+
+
+def unbundle_thumbnails(blob):
+    """
+    Return ``{(format, width): data}`` for a stored thumbnail.
+    """
+    magic, count = BUNDLE_HEADER.unpack_from(blob)
+    if magic != BUNDLE_MAGIC:
+        return {("webp", LEGACY_THUMBNAIL_WIDTH): blob}
+    variants = {}
+    offset = BUNDLE_HEADER.size + count * VARIANT.size
+    for index in range(count):
+        format, width, length = VARIANT.unpack_from(blob, BUNDLE_HEADER.size + index * VARIANT.size)
+        variants[(format.decode().rstrip("\0"), width)] = blob[offset:offset + length]
+        offset += length
+    return variants
+
+
+def choose_thumbnail(variants, width=DEFAULT_THUMBNAIL_WIDTH, accept="image/webp"):
+    """
+    Pick the variant of ``variants`` to serve: the smallest at least
+    ``width`` pixels wide (or the largest there is), in whichever format
+    ``accept`` allows has the fewest bytes. Returns ``(format, width)`` or
+    None.
+    """
+    accepted = [
+        format for format in THUMBNAIL_FORMATS
+        if THUMBNAIL_FORMATS[format] in accept or (format == "webp" and ("image/*" in accept or "*/*" in accept))
+    ] or ["webp"]
+    candidates = [key for key in variants if key[0] in accepted]
+    if not candidates:
+        return None
+    widths = sorted({w for _, w in candidates})
+    width = next((w for w in widths if w >= width), widths[-1])
+    return min((key for key in candidates if key[1] == width), key=lambda key: len(variants[key]))
+
+
+class ThumbnailPack:
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index"
+        self.index_path.touch(exist_ok=True)
+        self.lock_path = self.root / "lock"
+        self.maps = {}
+        self.maps_lock = threading.Lock()
+        self.active_segment = None
+
+    def segment_path(self, segment):
+        return self.root / f"{segment:06}.seg"
+
+    def segments(self):
+        return sorted(int(path.stem) for path in self.root.glob("*.seg"))
+
+    def mapping(self, key, path, needed):
+        """
+        Return an mmap of ``path`` covering at least ``needed`` bytes, or
+        None when the file is shorter. Files only grow, so a mapping is
+        replaced when a read goes past its end.
+        """
+        view = self.maps.get(key)
+        if view is not None and len(view) >= needed:
+            return view
+        with self.maps_lock:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < needed:
+                    return None
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Old mappings are left to the garbage collector, as other
+            # threads may still be slicing them.
+            self.maps[key] = view
+            return view
+
+    def entry(self, document_id):
+        position = document_id * INDEX_ENTRY.size
+        index = self.mapping("index", self.index_path, position + INDEX_ENTRY.size)
+        if index is None:
+            return None
+        segment, offset, length = INDEX_ENTRY.unpack_from(index, position)
+        if not segment:
+            return None
+        return segment, offset, length
+
+    def get(self, document_id):
+        """
+        Return the stored thumbnail of ``document_id``, or None.
+        """
+        for attempt in range(2):
+            entry = self.entry(document_id)
+            if entry is None:
+                return None
+            segment, offset, length = entry
+            end = offset + RECORD.size + length
+            try:
+                view = self.mapping(segment, self.segment_path(segment), end)
+            except FileNotFoundError:
+                # Compaction moved the record and removed the segment
+                # between reading the entry and opening the segment.
+                continue
+            if view is None:
+                break
+            record_id, record_length = RECORD.unpack_from(view, offset)
+            if (record_id, record_length) != (document_id, length):
+                break
+            return view[offset + RECORD.size:end]
+        raise CorruptPack(f"Index entry of thumbnail {document_id} does not match its segment")
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, document_id, data):
+        """
+        Append a record to the active segment and return its index entry.
+        Must be called with the lock held.
+        """
+        segment = self.active_segment
+        try:
+            size = self.segment_path(segment).stat().st_size if segment else None
+        except FileNotFoundError:
+            size = None
+        if size is None or size >= SEGMENT_SIZE:
+            # Another process may have started a newer segment.
+            segments = self.segments()
+            segment = segments[-1] if segments else 1
+            size = self.segment_path(segment).stat().st_size if segments else 0
+        if size >= SEGMENT_SIZE:
+            segment += 1
+        self.active_segment = segment
+
+        with open(self.segment_path(segment), "ab") as f:
+            # Sizes seen before opening may be stale; the lock keeps the
+            # end of the file where it is until the write.
+            offset = f.seek(0, os.SEEK_END)
+            f.write(RECORD.pack(document_id, len(data)) + data)
+        return INDEX_ENTRY.pack(segment, offset, len(data))
+
+    def write_entries(self, entries):
+        fd = os.open(self.index_path, os.O_WRONLY)
+        try:
+            for document_id, entry in entries:
+                os.pwrite(fd, entry, document_id * INDEX_ENTRY.size)
+        finally:
+            os.close(fd)
+
+    def put(self, document_id, data):
+        with self.locked():
+            self.write_entries([(document_id, self.append(document_id, data))])
+
+    def delete(self, document_ids):
+        with self.locked():
+            self.write_entries(
+                (document_id, EMPTY_ENTRY) for document_id in document_ids
+                if self.entry(document_id) is not None
+            )
+
+    def entries(self):
+        """
+        Yield ``(document_id, segment, offset, length)`` for every entry.
+        """
+        size = self.index_path.stat().st_size
+        if not size:
+            return
+        index = self.mapping("index", self.index_path, size)
+        for document_id, (segment, offset, length) in enumerate(INDEX_ENTRY.iter_unpack(index[:size - size % INDEX_ENTRY.size])):
+            if segment:
+                yield document_id, segment, offset, length
+
+    def compact(self, existing=None, min_live_ratio=MIN_LIVE_RATIO):
+        """
+        Drop dead records by rewriting every segment (except the one being
+        appended to) whose live data is below ``min_live_ratio`` of its
+        size. ``existing(ids)``, when given, returns which document ids
+        still exist; entries of the others are deleted first. Returns
+        ``(segments, bytes)`` reclaimed.
+        """
+        if existing is not None:
+            ids = [document_id for document_id, _, _, _ in self.entries()]
+            for start in range(0, len(ids), 1000):
+                batch = ids[start:start + 1000]
+                alive = existing(batch)
+                self.delete([document_id for document_id in batch if document_id not in alive])
+
+        live = {}
+        for document_id, segment, offset, length in self.entries():
+            live.setdefault(segment, []).append((document_id, offset, length))
+
+        reclaimed = [0, 0]
+        segments = self.segments()
+        for segment in segments[:-1]:
+            path = self.segment_path(segment)
+            size = path.stat().st_size
+            records = live.get(segment, [])
+            if sum(RECORD.size + length for _, _, length in records) >= size * min_live_ratio:
+                continue
+
+            with self.locked():
+                if path.stat().st_size != size:
+                    # Appended to since the scan; try again next time.
+                    continue
+                moved = []
+                for document_id, offset, length in records:
+                    # Skip records replaced or deleted since the scan.
+                    if self.entry(document_id) != (segment, offset, length):
+                        continue
+                    data = self.get(document_id)
+                    moved.append((document_id, self.append(document_id, data)))
+                self.write_entries(moved)
+                path.unlink()
+            self.maps.pop(segment, None)
+            reclaimed[0] += 1
+            reclaimed[1] += size
+        return tuple(reclaimed)
+
+
+@cache
+def get_thumbnail_pack(root):
+    return ThumbnailPack(root)
+
+
+def thumbnail_pack():
+    return get_thumbnail_pack(Path(settings.THUMBNAIL_DIR) / PACK_PREFIX)
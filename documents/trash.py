@@ -0,0 +1,79 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from documents.bulk_edit import batched_ids
+from documents.models import Document, Note
+from documents.storage import get_storage, ORIGINALS, ARCHIVE, THUMBNAILS
+from documents.thumbnails import thumbnail_pack
+from documents.previews import preview_cache
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+
+def stored_files(document):
+    files = [
+        (ORIGINALS, document.source_name),
+        (THUMBNAILS, document.thumbnail_name),
+        (THUMBNAILS, document.legacy_thumbnail_name),
+    ]
+    if document.has_archive_version:
+        files.append((ARCHIVE, document.archive_name))
+    return files
+
+
+def purge_documents(queryset, batch_size=BATCH_SIZE):
+    """
+    Permanently delete the documents in ``queryset`` together with their
+    notes, tag links and stored files, and return how many were deleted.
+
+    Every batch is deleted in its own short transaction. Files are removed
+    after the commit, so a failure leaves orphaned files for the garbage
+    collector rather than rows whose files are gone.
+    """
+    storages = {area: get_storage(area) for area in (ORIGINALS, ARCHIVE, THUMBNAILS)}
+    purged = 0
+
+    for batch in batched_ids(queryset, batch_size):
+        documents = Document.global_objects.filter(pk__in=batch).only(
+            "id", "filename", "archive_filename", "storage_type", "compression"
+        )
+        files = [file for document in documents for file in stored_files(document)]
+
+        with transaction.atomic():
+            Document.global_objects.filter(pk__in=batch).hard_delete()
+
+        if settings.PACK_THUMBNAILS:
+            thumbnail_pack().delete(batch)
+        for document_id in batch:
+            preview_cache().delete(document_id)
+        for area, name in files:
+            try:
+                storages[area].delete(name)
+            except Exception as e:
+                logger.error(f"Cannot delete {area}/{name}: {e}")
+        purged += len(batch)
+
+    return purged
+
+
+def purge_trash(older_than=timedelta(days=30), batch_size=BATCH_SIZE):
+    """
+    Permanently delete documents and notes that were soft-deleted more
+    than ``older_than`` ago. Returns ``(documents, notes)`` counts.
+    """
+    cutoff = timezone.now() - older_than
+    documents = purge_documents(Document.deleted_objects.filter(deleted_at__lt=cutoff), batch_size)
+
+    notes = 0
+    for batch in batched_ids(Note.deleted_objects.filter(deleted_at__lt=cutoff), batch_size):
+        with transaction.atomic():
+            Note.global_objects.filter(pk__in=batch).hard_delete()
+        notes += len(batch)
+
+    return documents, notes
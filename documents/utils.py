@@ -1,14 +1,15 @@
-import subprocess
 import os
 
+from documents.watchdog import run_tool
+
 def convert_to_pdf(input_path, output_pdf_path):
-    subprocess.run([
+    run_tool([
         "libreoffice", "--headless", "--convert-to", "pdf", "--outdir",
         os.path.dirname(output_pdf_path), input_path
-    ], check=True)
+    ])
 
 def convert_pdf_to_pdfa(input_pdf, output_pdfa):
-    subprocess.run([
+    run_tool([
         "gs",
         "-dPDFA=3",  # PDF/A-2, change to 1 or 3 if needed
         "-dBATCH",
@@ -19,4 +20,4 @@ def convert_pdf_to_pdfa(input_pdf, output_pdfa):
         "-sPDFACompatibilityPolicy=1",
         f"-sOutputFile={output_pdfa}",
         input_pdf
-    ], check=True)
+    ])
@@ -6,12 +6,20 @@ from rest_framework import filters
 from django_filters.rest_framework import FilterSet, DateFilter, ModelMultipleChoiceFilter
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.decorators import action
+from itertools import islice
 import json
 
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from pathlib import Path
 from django.conf import settings
-from django.http import FileResponse
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.http import content_disposition_header
+from rest_framework.serializers import BaseSerializer
 
 from documents.serializers import (
     TagSerializer,
@@ -22,6 +30,13 @@ from documents.serializers import (
     PostDocumentSerializer,
     ProjectSerializer,
     NotesSerializer,
+    BulkEditSerializer,
+    RedriveSerializer,
+    DocumentExportSerializer,
+    DocumentListValuesSerializer,
+    DocumentExportValuesSerializer,
+    ProjectValuesSerializer,
+    NotesValuesSerializer,
 )
 
 from documents.models import (
@@ -32,8 +47,208 @@ from documents.models import (
     Note,
     Correspondent,
 )
-from documents.tasks import process_document
-from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes
+from documents.tasks import process_document, queue_previews, redrive_documents
+from documents.bulk_edit import bulk_edit
+from documents.zipstream import ZipStream
+from documents.storage import get_storage, ORIGINALS, ARCHIVE
+from documents.crypto import decrypt_bytes, is_encrypted_data, save_encrypted, ENCRYPTED_SUFFIX
+from documents.previews import preview_cache, preview_width, PREVIEW_WIDTHS
+from documents.thumbnails import DEFAULT_THUMBNAIL_WIDTH, THUMBNAIL_SIZES
+from documents import events
+from documents.events import event_stream, publish_event
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
+from document_archive.renderers import ORJSONRenderer
+
+EXPORT_CHUNK_SIZE = 500
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(name="fields", description="Comma separated list of fields to return", required=False, type=str),
+    OpenApiParameter(name="expand", description="Comma separated list of expensive fields (nested relations, thumbnails) to include", required=False, type=str),
+]
+
+
+def select_serializer_fields(queryset, serializer, extra_columns=()):
+    """
+    Restrict ``queryset`` to the columns and relations ``serializer`` reads,
+    using only() for concrete columns and a narrowed Prefetch per relation.
+    """
+    opts = queryset.model._meta
+    field_sources = getattr(getattr(serializer, "Meta", None), "field_sources", {})
+    columns = {opts.pk.name, *extra_columns}
+    prefetches = []
+
+    for field_name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        for source in field_sources.get(field_name, [field.source]):
+            try:
+                model_field = opts.get_field(source)
+            except FieldDoesNotExist:
+                continue
+
+            if not model_field.is_relation:
+                columns.add(source)
+                continue
+
+            if model_field.many_to_one:
+                columns.add(source)
+                if not isinstance(field, BaseSerializer):
+                    continue
+
+            related_queryset = model_field.related_model._default_manager.all()
+            nested = getattr(field, "child", field)
+            back_reference = [model_field.field.name] if model_field.one_to_many else []
+            if isinstance(nested, BaseSerializer):
+                related_queryset = select_serializer_fields(related_queryset, nested, back_reference)
+            else:
+                related_queryset = related_queryset.only(
+                    model_field.related_model._meta.pk.name, *back_reference
+                )
+            prefetches.append(Prefetch(source, queryset=related_queryset))
+
+    return queryset.only(*columns).prefetch_related(*prefetches)
+
+
+def file_download(storage, name, filename, mime_type):
+    """
+    Redirect to a presigned URL when the storage has one, so the object
+    store serves the bytes; otherwise stream the file through the API.
+    """
+    url = storage.url(name, filename=filename, mime_type=mime_type)
+    if url:
+        return HttpResponseRedirect(url)
+    try:
+        return FileResponse(storage.open(name), as_attachment=True, filename=filename)
+    except FileNotFoundError:
+        return Response({"detail": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+async def document_events(request):
+    """
+    Stream processing events of the documents in ``?ids=`` as Server-Sent
+    Events: their current state first, then queued, converting,
+    thumbnailing, retrying, done and failed as they happen.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        document_ids = sorted({int(pk) for pk in request.GET.get("ids", "").split(",")})
+    except ValueError:
+        return JsonResponse({"detail": "ids must be comma separated document ids"}, status=400)
+    if len(document_ids) > settings.SSE_MAX_DOCUMENTS:
+        return JsonResponse({"detail": f"At most {settings.SSE_MAX_DOCUMENTS} documents per stream"}, status=400)
+
+    response = StreamingHttpResponse(event_stream(document_ids), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stops nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single ``bytes=`` range in
+    ``header``, None when there is no usable range and ``False`` when the
+    range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def stream_download(request, fileobj, size, filename, mime_type):
+    """
+    Stream ``fileobj`` through the API, answering a single byte range with
+    206 Partial Content when the file is seekable.
+    """
+    seekable = fileobj.seekable()
+    byte_range = parse_range(request.headers.get("Range"), size) if seekable else None
+
+    if byte_range is False:
+        fileobj.close()
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(fileobj, as_attachment=True, filename=filename, content_type=mime_type)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        fileobj.seek(start)
+
+        def chunks(remaining=end - start + 1):
+            with fileobj:
+                while remaining > 0 and (chunk := fileobj.read(min(remaining, FileResponse.block_size))):
+                    remaining -= len(chunk)
+                    yield chunk
+
+        response = StreamingHttpResponse(chunks(), status=status.HTTP_206_PARTIAL_CONTENT, content_type=mime_type)
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+    if seekable:
+        response["Accept-Ranges"] = "bytes"
+    return response
+
+
+class SparseFieldsMixin:
+    """
+    Support ``?fields=`` and ``?expand=`` on the read actions. Both take a comma
+    separated list of field names, and the queryset is narrowed to match so
+    unrequested columns, relations and thumbnails are never loaded.
+    """
+    sparse_fields_actions = ("list", "retrieve")
+
+    def get_field_list(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.sparse_fields_actions:
+            context["fields"] = self.get_field_list("fields")
+            context["expand"] = self.get_field_list("expand")
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.sparse_fields_actions:
+            queryset = select_serializer_fields(queryset, self.get_serializer())
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Serve the list action from ``values()`` rows through
+    ``values_serializer_class``, which produces the same JSON as the regular
+    serializer without building a model instance and field objects per row.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None).values(*serializer.columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
+
 
 class SetPagination(PageNumberPagination):
     page_size = 100
@@ -50,10 +265,11 @@ class ProjectFilter(FilterSet):
             'status': ['exact'],
         }
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
+    values_serializer_class = ProjectValuesSerializer
 
     filter_backends=[DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ProjectFilter
@@ -87,10 +303,11 @@ class DocumentTypeViewSet(viewsets.ModelViewSet):
     serializer_class = DocumentTypeSerializer
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Note.objects.all()
     serializer_class = NotesSerializer
+    values_serializer_class = NotesValuesSerializer
 
     filter_backends=[DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ["document"]
@@ -131,17 +348,24 @@ class DocumentFilter(FilterSet):
         fields = {
             'project': ['exact'],
             'document_type': ['exact'],
+            'processing_status': ['exact'],
         }
 
 
-class DocumentDetailViewSet(viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+)
+class DocumentDetailViewSet(ValuesListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Document.objects.all()
+    values_serializer_class = DocumentListValuesSerializer
     filter_backends=[DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = DocumentFilter
     ordering_fields = ["created", "added", "project"]
     pagination_class = SetPagination
     search_fields=["title"]
+    sparse_fields_actions = ("list", "retrieve", "export")
 
 
     def get_serializer_class(self):
@@ -149,6 +373,8 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
             return DocumentListSerializer
         elif self.action == "create" :
             return PostDocumentSerializer
+        elif self.action == "export":
+            return DocumentExportSerializer
         else:
             return DocumentDetailSerializer
 
@@ -191,12 +417,32 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
 
+        # A copy in the trash still holds the unique checksum. Uploading the
+        # file again brings it back, with its notes and tags.
+        trashed_document = Document.deleted_objects.filter(checksum=checksum).first()
+        if trashed_document:
+            # strict would refuse the notes, which refer to users
+            trashed_document.restore(strict=False)
+            return Response(
+                {
+                    "status": "duplicate",
+                    "message": "This document was in the trash and has been restored",
+                    "id": trashed_document.id
+                },
+                status=status.HTTP_200_OK
+            )
+
         filename = f"{checksum}_{doc_name}"
-        full_path = Path(settings.ORIGINAL_DIR) / filename
+        storage = get_storage(ORIGINALS)
 
-        if not full_path.exists():
-            with open(full_path, "wb") as f:
-                f.write(doc_data)
+        if settings.ENCRYPT_DOCUMENTS:
+            storage_type = Document.STORAGE_TYPE_GPG
+            if not storage.exists(filename + ENCRYPTED_SUFFIX):
+                save_encrypted(storage, filename + ENCRYPTED_SUFFIX, doc_data)
+        else:
+            storage_type = Document.STORAGE_TYPE_UNENCRYPTED
+            if not storage.exists(filename):
+                storage.save(filename, doc_data)
 
 
         document = Document.objects.create(
@@ -208,7 +454,7 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
             created=created,
             project=project,
             mime_type=mime_type,
-            storage_type=Document.STORAGE_TYPE_UNENCRYPTED,
+            storage_type=storage_type,
             checksum=checksum
         )
 
@@ -216,7 +462,8 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
             document.tags.set(tag_ids)
 
         
-        process_document.delay(document.id)
+        process_document.apply_async((document.id,), queue=serializer.validated_data["priority"])
+        publish_event(document.id, events.QUEUED)
 
         return Response(
             {"status": "success", "id": document.id}, 
@@ -274,11 +521,100 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='download-archive')
     def download_archive(self, request, pk=None):
         document = self.get_object()
-        if document.archive_file:
-            response = FileResponse(document.archive_file)
-            response['Content-Disposition'] = f'attachment; filename="{document.original_filename or "document"}"'
-            return response
-        return Response({"detail": "No archive file available"}, status=404)
+        if not document.has_archive_version:
+            return Response({"detail": "No archive file available"}, status=404)
+        filename = document.original_filename or "document"
+        if document.is_encrypted:
+            try:
+                return stream_download(request, document.archive_file, document.archive_size, filename, "application/pdf")
+            except FileNotFoundError:
+                return Response({"detail": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+        return file_download(get_storage(ARCHIVE), document.archive_name, filename, "application/pdf")
+
+    @extend_schema(
+        description=(
+            "Get the document's thumbnail, in the smallest stored size at least `width` pixels wide "
+            f"({', '.join(map(str, THUMBNAIL_SIZES))}), as AVIF when the Accept header allows it and "
+            "WebP otherwise."
+        ),
+        responses={
+            (200, "image/avif"): OpenApiTypes.BINARY,
+            (200, "image/webp"): OpenApiTypes.BINARY,
+            400: {"type": "object", "properties": {"detail": {"type": "string"}}},
+            404: {"type": "object", "properties": {"detail": {"type": "string"}}},
+        },
+        parameters=[
+            OpenApiParameter(name="width", description="Display width in device pixels", required=False, type=int),
+        ],
+    )
+    @action(detail=True, methods=['get'], url_path='thumbnail')
+    def thumbnail(self, request, pk=None):
+        document = self.get_object()
+        try:
+            width = int(request.query_params.get("width", DEFAULT_THUMBNAIL_WIDTH))
+        except ValueError:
+            return Response({"detail": "width must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        variant = document.thumbnail_variant(width, request.headers.get("Accept") or "*/*")
+        if variant is None:
+            return Response({"detail": "No thumbnail available"}, status=status.HTTP_404_NOT_FOUND)
+        mime_type, data = variant
+        response = HttpResponse(data, content_type=mime_type)
+        response["Vary"] = "Accept"
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
+    @extend_schema(
+        description=(
+            "Render one page of the archive as a WebP image. Widths are rounded up to one of "
+            f"{', '.join(map(str, PREVIEW_WIDTHS))}. Pages are rendered by the workers and cached, and "
+            "the following pages are prefetched. Answers 202 with Retry-After while a render takes longer "
+            "than the server is willing to wait."
+        ),
+        responses={
+            (200, "image/webp"): OpenApiTypes.BINARY,
+            202: {"type": "object", "properties": {"detail": {"type": "string"}}},
+            400: {"type": "object", "properties": {"detail": {"type": "string"}}},
+            404: {"type": "object", "properties": {"detail": {"type": "string"}}},
+        },
+        parameters=[
+            OpenApiParameter(name="page", description="Page number, starting at 1", required=False, type=int),
+            OpenApiParameter(name="width", description="Image width in pixels", required=False, type=int),
+        ],
+    )
+    @action(detail=True, methods=['get'], url_path='preview')
+    def preview(self, request, pk=None):
+        document = self.get_object()
+        if not document.has_archive_version:
+            return Response({"detail": "No archive file available"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            page = int(request.query_params.get("page", 1))
+            width = preview_width(int(request.query_params.get("width", PREVIEW_WIDTHS[1])))
+        except ValueError:
+            return Response({"detail": "page and width must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or (document.page_count and page > document.page_count):
+            return Response({"detail": "No such page"}, status=status.HTTP_404_NOT_FOUND)
+
+        cache = preview_cache()
+        data = cache.get(document.pk, page, width)
+        if data is None:
+            queue_previews(document, page, width)
+            data = cache.wait(document.pk, page, width, settings.PREVIEW_WAIT)
+            if data is None and not cache.pending(document.pk, page, width):
+                return Response({"detail": "No such page"}, status=status.HTTP_404_NOT_FOUND)
+            if data is None:
+                response = Response({"detail": "The preview is being rendered"}, status=status.HTTP_202_ACCEPTED)
+                response["Retry-After"] = "1"
+                return response
+        else:
+            # Speculatively render the pages a reader is likely to open next.
+            queue_previews(document, page + 1, width)
+
+        if is_encrypted_data(data):
+            data = decrypt_bytes(data)
+        response = HttpResponse(data, content_type="image/webp")
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
     
 
     @extend_schema(
@@ -290,8 +626,207 @@ class DocumentDetailViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='download-original')
     def download_original(self, request, pk=None):
         document = self.get_object()
-        response = FileResponse(document.source_file)
-        response['Content-Disposition'] = f'attachment; filename="{document.original_filename or "document"}"'
+        filename = document.original_filename or "document"
+        if document.is_encrypted or document.compression != Document.COMPRESSION_NONE:
+            # Encrypted and compressed originals are decoded on the fly, so
+            # they cannot be handed off to the storage backend.
+            try:
+                return stream_download(request, document.source_file, document.source_size, filename, document.mime_type)
+            except FileNotFoundError:
+                return Response({"detail": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+        return file_download(get_storage(ORIGINALS), document.source_name, filename, document.mime_type)
+
+    @extend_schema(
+        description=(
+            "Stream the metadata of every matching document, including tags, project and notes, "
+            "as newline-delimited JSON ordered by id. Resume an interrupted export with the last "
+            "id received as `after`."
+        ),
+        responses={
+            (200, "application/x-ndjson"): DocumentExportSerializer,
+            400: {"type": "object", "properties": {"detail": {"type": "string"}}},
+        },
+        parameters=[
+            OpenApiParameter(name="after", description="Only export documents with an id greater than this", required=False, type=int),
+            *SPARSE_FIELDS_PARAMETERS,
+        ],
+    )
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        try:
+            after = int(request.query_params.get("after", 0))
+        except ValueError:
+            return Response({"detail": "after must be a document id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = DocumentExportValuesSerializer(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__gt=after)
+        rows = (
+            queryset.order_by("pk")
+            .prefetch_related(None)
+            .values(*serializer.columns)
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        renderer = ORJSONRenderer()
+
+        def lines():
+            while batch := list(islice(rows, EXPORT_CHUNK_SIZE)):
+                for item in serializer.to_representation(batch):
+                    yield renderer.render(item) + b"\n"
+
+        response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+        response['Content-Disposition'] = 'attachment; filename="documents.ndjson"'
+        return response
+
+    @extend_schema(
+        description=(
+            "Edit many documents at once. Select them by `documents` ids or by a `query` of "
+            "document filter parameters, then add/remove tags or set the project, document "
+            "type or correspondent. Changes are applied in set-based batches."
+        ),
+        request=BulkEditSerializer,
+        responses={
+            200: {"type": "object", "properties": {
+                "status": {"type": "string"},
+                "documents": {"type": "integer"},
+            }},
+        },
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-edit')
+    def bulk_edit(self, request):
+        serializer = BulkEditSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if "documents" in data:
+            queryset = Document.objects.filter(pk__in=data["documents"])
+        else:
+            # An empty or unrecognised query would select every document
+            filters = {
+                name for name, value in data["query"].items()
+                if name in DocumentFilter.base_filters and value not in (None, "", [])
+            }
+            if not filters:
+                return Response(
+                    {"query": [f"Provide at least one filter: {', '.join(DocumentFilter.base_filters)}."]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            filterset = DocumentFilter(data=data["query"], queryset=Document.objects.all())
+            if not filterset.is_valid():
+                errors = translate_validation(filterset.errors).detail
+                return Response({"query": errors}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = filterset.qs
+
+        updates = {}
+        if "set_project" in data:
+            updates["project"] = data["set_project"]
+        if "set_document_type" in data:
+            updates["document_type"] = data["set_document_type"]
+        if "set_correspondent" in data:
+            updates["correspondent"] = data["set_correspondent"]
+
+        edited = bulk_edit(
+            queryset,
+            add_tags=[tag.id for tag in data.get("add_tags", [])],
+            remove_tags=[tag.id for tag in data.get("remove_tags", [])],
+            updates=updates,
+        )
+
+        return Response({"status": "success", "documents": edited}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Queue failed documents for processing again with a fresh set of retries, "
+            "e.g. after a storage outage or once a missing tool is installed."
+        ),
+        request=RedriveSerializer,
+        responses={200: {"type": "object", "properties": {
+            "status": {"type": "string"},
+            "documents": {"type": "integer"},
+        }}},
+    )
+    @action(detail=False, methods=['post'], url_path='redrive')
+    def redrive(self, request):
+        serializer = RedriveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        queryset = Document.objects.filter(processing_status=Document.PROCESSING_FAILED)
+        if "documents" in data:
+            queryset = queryset.filter(pk__in=data["documents"])
+        if data.get("reasons"):
+            queryset = queryset.filter(failure_reason__in=data["reasons"])
+
+        queued = redrive_documents(queryset, data["priority"])
+        return Response({"status": "success", "documents": queued}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Download the selected documents as a zip streamed straight from storage. "
+            "Select documents with the usual filters (e.g. `project`) or `ids`."
+        ),
+        responses={
+            200: OpenApiTypes.BINARY,
+            400: {"type": "object", "properties": {"detail": {"type": "string"}}},
+            404: {"type": "object", "properties": {"detail": {"type": "string"}}},
+        },
+        parameters=[
+            OpenApiParameter(name="ids", description="Comma separated document ids", required=False, type=str),
+            OpenApiParameter(name="content", description="originals, archives or both", required=False, type=str, enum=["originals", "archives", "both"]),
+        ],
+    )
+    @action(detail=False, methods=['get'], url_path='bulk-download')
+    def bulk_download(self, request):
+        content = request.query_params.get("content", "originals")
+        if content not in ("originals", "archives", "both"):
+            return Response({"detail": "content must be originals, archives or both"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = request.query_params.get("ids")
+        if ids:
+            try:
+                queryset = queryset.filter(pk__in=[int(pk) for pk in ids.split(",")])
+            except ValueError:
+                return Response({"detail": "ids must be comma separated document ids"}, status=status.HTTP_400_BAD_REQUEST)
+
+        documents = queryset.order_by("pk").only(
+            "id", "filename", "archive_filename", "original_filename", "storage_type", "compression", "modified",
+        )
+
+        archive = ZipStream()
+        for document in documents.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            name = f"{document.pk:07}_{document.original_filename or document.filename}"
+            files = []
+            if content in ("originals", "both"):
+                files.append((
+                    "originals/", name,
+                    lambda: document.source_size,
+                    lambda document=document: document.source_file,
+                ))
+            if content in ("archives", "both") and document.has_archive_version:
+                files.append((
+                    "archives/", f"{Path(name).stem}.pdf",
+                    lambda: document.archive_size,
+                    lambda document=document: document.archive_file,
+                ))
+
+            for folder, file_name, size, opener in files:
+                try:
+                    size = size()
+                except FileNotFoundError:
+                    continue
+                archive.add(
+                    f"{folder}{file_name}" if content == "both" else file_name,
+                    size,
+                    opener,
+                    modified=document.modified,
+                )
+
+        if not archive.entries:
+            return Response({"detail": "No files to download"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(archive, content_type="application/zip")
+        response['Content-Length'] = str(archive.size())
+        response['Content-Disposition'] = 'attachment; filename="documents.zip"'
         return response
 
     @extend_schema(
@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+import resource
+import signal
+import subprocess
+from contextlib import suppress
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Why a supervised run failed, saved on the document
+FAILURE_TIMEOUT = "timeout"
+FAILURE_CPU = "cpu"
+FAILURE_MEMORY = "memory"
+FAILURE_MEMORY_LIMIT = "memory_limit"
+FAILURE_CRASH = "crash"
+FAILURE_EXIT = "exit"
+FAILURE_MISSING = "missing"
+FAILURE_UNAVAILABLE = "unavailable"
+FAILURE_ERROR = "error"
+FAILURE_REASONS = (
+    (FAILURE_TIMEOUT, "Timed out"),
+    (FAILURE_CPU, "CPU time limit exceeded"),
+    (FAILURE_MEMORY, "Killed by the OOM killer"),
+    (FAILURE_MEMORY_LIMIT, "Memory limit exceeded"),
+    (FAILURE_CRASH, "Crashed"),
+    (FAILURE_EXIT, "Exited with an error"),
+    (FAILURE_MISSING, "Tool not installed"),
+    (FAILURE_UNAVAILABLE, "Storage or database unavailable"),
+    (FAILURE_ERROR, "Other error"),
+)
+
+# Wall clock timeout setting of every supervised tool
+TOOL_TIMEOUTS = {
+    "gs": "GHOSTSCRIPT_TIMEOUT",
+    "libreoffice": "LIBREOFFICE_TIMEOUT",
+}
+
+# Allocation failures as reported by GhostScript, C++ and libc
+OUT_OF_MEMORY = re.compile(rb"VMerror|bad_alloc|out of memory|Cannot allocate memory", re.IGNORECASE)
+
+# Output kept for the failure message
+OUTPUT_TAIL = 2000
+
+
+class ToolError(Exception):
+    """
+    A supervised run failed; ``reason`` is one of the FAILURE_* constants.
+    """
+
+    def __init__(self, tool, reason, message):
+        super().__init__(f"{tool} failed ({reason}): {message}")
+        self.tool = tool
+        self.reason = reason
+
+
+def limit_resources(cpu_seconds, memory):
+    """
+    Return a preexec_fn capping CPU time and memory of the child. SIGXCPU
+    arrives at the soft CPU limit, SIGKILL a few seconds later.
+    """
+
+    def apply_limits():
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        # RLIMIT_DATA covers the heap and anonymous mappings but not shared
+        # libraries, which LibreOffice maps plenty of.
+        resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    return apply_limits
+
+
+def kill_group(process):
+    # Also reaps helpers the tool left behind, e.g. soffice.bin
+    with suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def failure_reason(returncode, output):
+    if returncode == -signal.SIGXCPU:
+        return FAILURE_CPU
+    if returncode == -signal.SIGKILL:
+        # SIGXCPU is not ignored by any of the tools, so SIGKILL before the
+        # timeout comes from the OOM killer
+        return FAILURE_MEMORY
+    if OUT_OF_MEMORY.search(output):
+        # An allocation refused under RLIMIT_DATA: the input needs more
+        # than SUBPROCESS_MEMORY_LIMIT and will every time
+        return FAILURE_MEMORY_LIMIT
+    if returncode < 0:
+        return FAILURE_CRASH
+    return FAILURE_EXIT
+
+
+def run_tool(args, timeout=None):
+    """
+    Run ``args`` in its own process group with the CPU time and memory
+    limits for its tool, like ``subprocess.run(args, check=True)``.
+
+    The whole group is killed when the run exceeds ``timeout`` seconds
+    (GHOSTSCRIPT_TIMEOUT or LIBREOFFICE_TIMEOUT by default) and when it
+    ends. Raises ToolError with the reason and the tail of the output.
+    """
+    tool = Path(args[0]).name
+    timeout = timeout or getattr(settings, TOOL_TIMEOUTS[tool])
+    try:
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+            preexec_fn=limit_resources(timeout, settings.SUBPROCESS_MEMORY_LIMIT),
+        )
+    except FileNotFoundError:
+        raise ToolError(tool, FAILURE_MISSING, f"{args[0]} is not installed")
+
+    try:
+        output, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_group(process)
+        # A daemonized helper may still hold the pipe
+        with suppress(subprocess.TimeoutExpired):
+            process.communicate(timeout=5)
+        process.wait()
+        raise ToolError(tool, FAILURE_TIMEOUT, f"killed after {timeout} seconds")
+    finally:
+        kill_group(process)
+
+    if process.returncode:
+        tail = output[-OUTPUT_TAIL:].decode(errors="replace").strip()
+        reason = failure_reason(process.returncode, output)
+        raise ToolError(tool, reason, f"exit status {process.returncode}: {tail}")
+    return output
@@ -0,0 +1,177 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Callable
+
+from django.utils import timezone
+
+CHUNK_SIZE = 1024 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+
+# Bit 3: CRC-32 follows the data in a data descriptor.
+# Bit 11: file names are UTF-8.
+FLAGS = 0x0008 | 0x0800
+
+
+@dataclass
+class ZipEntry:
+    name: str
+    size: int
+    opener: Callable
+    modified: object = None
+    offset: int = 0
+    crc: int = 0
+
+    @property
+    def encoded_name(self):
+        return self.name.encode("utf-8")
+
+    @property
+    def zip64(self):
+        return self.size >= ZIP32_LIMIT
+
+    @property
+    def dos_time(self):
+        modified = timezone.localtime(self.modified) if self.modified else timezone.localtime()
+        if modified.year < 1980:
+            return 0, (1 << 5) | 1
+        time = (modified.hour << 11) | (modified.minute << 5) | (modified.second // 2)
+        date = ((modified.year - 1980) << 9) | (modified.month << 5) | modified.day
+        return time, date
+
+
+class ZipStream:
+    """
+    Build a zip archive on the fly from files whose sizes are known up front.
+
+    Entries are stored uncompressed and their CRC-32 is written in a data
+    descriptor after the data, so the archive is produced in a single pass
+    with constant memory and its exact size is known before the first byte
+    is sent. ZIP64 records are used for entries and archives past 4 GiB.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, name, size, opener, modified=None):
+        """
+        Add an entry of ``size`` bytes read from the binary file returned by
+        calling ``opener``.
+        """
+        self.entries.append(ZipEntry(name=name, size=size, opener=opener, modified=modified))
+
+    def local_header(self, entry):
+        time, date = entry.dos_time
+        if entry.zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            size_field = ZIP32_LIMIT
+            version = VERSION_ZIP64
+        else:
+            extra = b""
+            size_field = 0
+            version = VERSION_DEFAULT
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, version, FLAGS, 0, time, date,
+            0, size_field, size_field,
+            len(entry.encoded_name), len(extra),
+        ) + entry.encoded_name + extra
+
+    def data_descriptor(self, entry):
+        if entry.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, entry.crc, entry.size, entry.size)
+        return struct.pack("<IIII", 0x08074B50, entry.crc, entry.size, entry.size)
+
+    def central_header(self, entry):
+        time, date = entry.dos_time
+        zip64_fields = []
+        size_field = entry.size
+        offset_field = entry.offset
+        if entry.zip64:
+            zip64_fields += [entry.size, entry.size]
+            size_field = ZIP32_LIMIT
+        if entry.offset >= ZIP32_LIMIT:
+            zip64_fields.append(entry.offset)
+            offset_field = ZIP32_LIMIT
+
+        extra = b""
+        version = VERSION_DEFAULT
+        if zip64_fields:
+            extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = VERSION_ZIP64
+
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50, version, version, FLAGS, 0, time, date,
+            entry.crc, size_field, size_field,
+            len(entry.encoded_name), len(extra), 0, 0, 0, 0, offset_field,
+        ) + entry.encoded_name + extra
+
+    def end_records(self, central_offset, central_size):
+        count = len(self.entries)
+        records = b""
+        if (
+            count >= ZIP32_MAX_ENTRIES
+            or central_offset >= ZIP32_LIMIT
+            or central_size >= ZIP32_LIMIT
+        ):
+            zip64_offset = central_offset + central_size
+            records += struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, central_size, central_offset,
+            )
+            records += struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1)
+            count = min(count, ZIP32_MAX_ENTRIES)
+            central_offset = min(central_offset, ZIP32_LIMIT)
+            central_size = min(central_size, ZIP32_LIMIT)
+        records += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50, 0, 0, count, count, central_size, central_offset, 0,
+        )
+        return records
+
+    def layout(self):
+        """
+        Assign each entry its offset and return the offset of the central
+        directory. Header lengths do not depend on the CRC, so this works
+        before any data has been read.
+        """
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            offset += len(self.local_header(entry)) + entry.size + len(self.data_descriptor(entry))
+        return offset
+
+    def size(self):
+        central_offset = self.layout()
+        central_size = sum(len(self.central_header(entry)) for entry in self.entries)
+        return central_offset + central_size + len(self.end_records(central_offset, central_size))
+
+    def __iter__(self):
+        central_offset = self.layout()
+        for entry in self.entries:
+            yield self.local_header(entry)
+
+            crc = 0
+            remaining = entry.size
+            with entry.opener() as f:
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise IOError(f"{entry.name} is shorter than its expected {entry.size} bytes")
+                    crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+                    yield chunk
+            entry.crc = crc
+
+            yield self.data_descriptor(entry)
+
+        central_directory = b"".join(self.central_header(entry) for entry in self.entries)
+        yield central_directory
+        yield self.end_records(central_offset, len(central_directory))
@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Serves only /api/documents/events/ (see nginx/default.conf). The rest of
+# the API stays on WSGI in production.sh, where streamed downloads are sent
+# chunk by chunk and slow requests do not share a thread.
+echo "Starting event stream server..."
+pipenv run gunicorn document_archive.asgi:application --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8001
\ No newline at end of file
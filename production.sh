@@ -9,4 +9,5 @@ echo "Collecting static files..."
 pipenv run python manage.py collectstatic --noinput
 
 echo "Starting Server..."
-pipenv run gunicorn document_archive.wsgi:application --bind 0.0.0.0:8000
+# Sync workers serve one request each; WEB_CONCURRENCY sets how many.
+pipenv run gunicorn document_archive.wsgi:application --workers "${WEB_CONCURRENCY:-4}" --bind 0.0.0.0:8000